@@ -23,24 +23,38 @@ celery_app = Celery(
 )
 
 # Celery configuration
+#
+# CPU-bound scan/redact tasks and I/O-bound housekeeping run on separate queues
+# so each can use a pool suited to it:
+#   celery -A backend.celery_app worker -Q pdf_processing -P prefork
+#   celery -A backend.celery_app worker -Q pdf_io -P threads -c 50 --prefetch-multiplier 8
 celery_app.conf.update(
     # Task routing
     task_routes={
         'backend.celery_tasks.process_pdf_async': {'queue': 'pdf_processing'},
         'backend.celery_tasks.process_pdf_scan_redact_async': {'queue': 'pdf_processing'},
+        'backend.celery_tasks.cleanup_temp_files': {'queue': 'pdf_io'},
     },
     
-    # Task settings
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    # Task settings: msgpack is a compact binary encoding with a C decoder;
+    # json stays accepted so tasks queued by older producers still run
+    task_serializer='msgpack',
+    accept_content=['msgpack', 'json'],
+    result_serializer='msgpack',
+    result_accept_content=['msgpack', 'json'],
     timezone='UTC',
     enable_utc=True,
     
     # Worker settings
-    worker_prefetch_multiplier=1,  # Process one task at a time per worker
+    # PDF scans range from one page to hundreds, so CPU workers reserve one task at a
+    # time; short uniform I/O tasks amortize the broker round-trip with a higher value
+    worker_prefetch_multiplier=int(os.getenv('CELERY_PREFETCH_MULTIPLIER', 1)),
     task_acks_late=True,  # Acknowledge task only after completion
-    worker_max_tasks_per_child=1000,  # Restart worker after 1000 tasks to prevent memory leaks
+    task_reject_on_worker_lost=True,  # Requeue late-acked tasks if the worker process dies
+    # Recycle workers on memory growth rather than a fixed task count; with jemalloc
+    # (see Dockerfile) RSS stays bounded, so restarts and their import cost are rare
+    worker_max_tasks_per_child=int(os.getenv('CELERY_MAX_TASKS_PER_CHILD', 50000)),
+    worker_max_memory_per_child=int(os.getenv('CELERY_MAX_MEMORY_PER_CHILD_KB', 1024 * 1024)),  # 1 GiB
     
     # Result settings
     result_expires=3600,  # Results expire after 1 hour
@@ -49,8 +63,12 @@ celery_app.conf.update(
     task_soft_time_limit=300,  # 5 minute soft limit
     task_time_limit=360,  # 6 minute hard limit
     
-    # Concurrency settings
-    worker_concurrency=min(8, (os.cpu_count() or 1) * 2),
+    # Concurrency settings: prefork processes for CPU-bound PDF work, one per core;
+    # override with -c or CELERY_WORKER_CONCURRENCY for I/O queue workers.
+    # CELERY_POOL=threads (or gevent, if installed) suits I/O-bound deployments.
+    # Prefer a few workers with higher concurrency over many single-slot workers
+    worker_pool=os.getenv('CELERY_POOL', 'prefork'),
+    worker_concurrency=int(os.getenv('CELERY_WORKER_CONCURRENCY', os.cpu_count() or 1)),
     
     # Queue settings
     task_default_queue='pdf_processing',
@@ -4,21 +4,137 @@ Celery tasks for asynchronous PDF processing.
 
 import os
 import time
+import json
+import hashlib
+import logging
 import traceback
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+
+import redis
 
 from celery import current_task
 from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
 
-from celery_app import celery_app
-from pdf_scanner import PDFScanner
+from celery_app import celery_app, REDIS_URL
+from pdf_scanner import PDFScanner, remove_file_if_present
 from database import ClickHouseDB
 from metrics import metrics_collector
 
+logger = logging.getLogger(__name__)
+
 # Initialize components (each worker will have its own instances)
 pdf_scanner = PDFScanner()
 db = ClickHouseDB()
 
+# Scan results of recently seen file contents, shared by all workers through Redis
+SCAN_CACHE_TTL = int(os.getenv('SCAN_CACHE_TTL', 3600))
+_redis_client = None
+
+def get_redis() -> redis.Redis:
+    """Get the Redis client for task caches, created lazily in each worker process."""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+# Results of finished tasks by document, so a redelivered task returns the stored
+# result instead of rescanning and inserting the document twice
+TASK_RESULT_TTL = int(os.getenv('TASK_RESULT_TTL', 3600))
+
+# A claim is a lease on the document: no run outlives the hard time limit, so a claim
+# that has not expired belongs to a run that may still finish. Redeliveries retry
+# until it finishes or its lease runs out
+CLAIM_LEASE_SECONDS = celery_app.conf.task_time_limit + 30
+CLAIM_RETRY_SECONDS = 30
+CLAIM_MAX_RETRIES = CLAIM_LEASE_SECONDS // CLAIM_RETRY_SECONDS + 1
+
+def claim_document(prefix: str, document_id: str, task_id: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    """
+    Claim a document for processing.
+    Returns (claimed, stored_result): stored_result is the result of a run that already
+    finished; claimed is False while another run's lease on the document is live.
+    """
+    try:
+        client = get_redis()
+        stored_result = client.get(f"{prefix}:result:{document_id}")
+        if stored_result:
+            return False, json.loads(stored_result)
+        claimed = client.set(f"{prefix}:{document_id}", task_id, nx=True, ex=CLAIM_LEASE_SECONDS)
+        return bool(claimed), None
+    except redis.RedisError as claim_error:
+        logger.warning("Task idempotency check unavailable: %s", claim_error)
+        return True, None
+
+def release_document(prefix: str, document_id: str, task_id: str):
+    """Drop this task's claim after a failed run, so a retry need not wait out the lease."""
+    try:
+        client = get_redis()
+        if client.get(f"{prefix}:{document_id}") == task_id.encode():
+            client.delete(f"{prefix}:{document_id}")
+    except redis.RedisError as claim_error:
+        logger.warning("Task idempotency check unavailable: %s", claim_error)
+
+def store_document_result(prefix: str, document_id: str, result: Dict[str, Any]):
+    """Store a finished task's result for redeliveries of the same document."""
+    try:
+        get_redis().set(f"{prefix}:result:{document_id}", json.dumps(result), ex=TASK_RESULT_TTL)
+    except redis.RedisError as store_error:
+        logger.warning("Task result store unavailable: %s", store_error)
+
+# Smaller files cannot hold a complete PDF (header, catalog, xref and trailer)
+MIN_PDF_SIZE = 100
+
+def has_pdf_header(file_path: str, file_size: int) -> bool:
+    """Cheap pre-check rejecting empty, truncated or non-PDF uploads before hashing and scanning."""
+    if file_size < MIN_PDF_SIZE:
+        return False
+    with open(file_path, 'rb') as f:
+        return f.read(5) == b'%PDF-'
+
+def invalid_pdf_result(prefix: str, operation_type: str, operation_id: str, task_id: str,
+                       document_id: str, filename: str, file_size: int) -> Dict[str, Any]:
+    """
+    Record an upload rejected by has_pdf_header and build the task's result.
+    The result is stored like any finished run's, so redeliveries return it too.
+    """
+    metrics_collector.record_error("invalid_pdf", operation_type)
+    metrics_collector.end_operation(operation_id, success=False, error_type="invalid_pdf")
+    result = {
+        'status': 'error',
+        'error': 'Invalid or corrupt PDF file',
+        'file_size': file_size,
+        'document_id': document_id,
+        'filename': filename,
+        'processing_time_ms': 0,
+        'task_id': task_id
+    }
+    store_document_result(prefix, document_id, result)
+    return result
+
+def file_digest(file_path: str) -> str:
+    """BLAKE2b digest of a file's contents, streamed rather than read whole."""
+    with open(file_path, 'rb') as f:
+        return hashlib.file_digest(f, 'blake2b').hexdigest()
+
+@worker_process_init.connect
+def connect_database(**kwargs):
+    """Connect each worker process once at startup instead of on its first task."""
+    db.connect()
+
+@worker_process_init.connect
+def disable_page_pool(**kwargs):
+    """Prefork children already run one scan per core; a page pool in each would oversubscribe it."""
+    pdf_scanner.use_page_pool = False
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_pending_results(**kwargs):
+    """Write scan results still buffered in this process before it exits."""
+    if db.client:
+        db.flush()
+
 @celery_app.task(bind=True, name='backend.celery_tasks.process_pdf_async')
 def process_pdf_async(self, file_path: str, document_id: str, filename: str) -> Dict[str, Any]:
     """
@@ -35,25 +151,55 @@ def process_pdf_async(self, file_path: str, document_id: str, filename: str) ->
     """
     operation_id = None
     
+    # Redelivered tasks return the result of the run that already finished, and wait
+    # for one still in progress rather than scanning the document a second time
+    claimed, previous_result = claim_document('scan', document_id, self.request.id)
+    if previous_result is not None:
+        return previous_result
+    if not claimed:
+        raise self.retry(countdown=CLAIM_RETRY_SECONDS, max_retries=CLAIM_MAX_RETRIES)
+    
     try:
-        # Update task state
+        # Only the start and the outcome are written to the result backend; the
+        # steps in between are too short to be worth a round-trip each
         self.update_state(state='PROGRESS', meta={'status': 'Starting PDF scan'})
         
-        # Get file size for metrics
-        file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        # One stat gives both the file size for metrics and the existence check
+        try:
+            file_size = os.stat(file_path).st_size
+        except FileNotFoundError:
+            file_size = None
         
         # Start metrics tracking
-        operation_id = metrics_collector.start_operation(document_id, "async_scan", file_size)
+        operation_id = metrics_collector.start_operation(document_id, "async_scan", file_size or 0)
         
         # Validate PDF exists
-        if not os.path.exists(file_path):
+        if file_size is None:
             raise FileNotFoundError(f"PDF file not found: {file_path}")
         
-        self.update_state(state='PROGRESS', meta={'status': 'Scanning PDF for sensitive data'})
+        # Misnamed or empty uploads fail here in microseconds, not after a full scan
+        if not has_pdf_header(file_path, file_size):
+            return invalid_pdf_result('scan', "async_scan", operation_id, self.request.id,
+                                      document_id, filename, file_size)
         
-        # Process the PDF
+        # Process the PDF, reusing the result of an earlier scan of identical content
         start_time = time.time()
-        scan_result = pdf_scanner.scan_pdf(file_path)
+        cache_key = f"scan:content:{file_digest(file_path)}"
+        scan_result = None
+        try:
+            cached_result = get_redis().get(cache_key)
+            if cached_result:
+                scan_result = json.loads(cached_result)
+        except redis.RedisError as cache_error:
+            logger.warning("Scan cache unavailable: %s", cache_error)
+        
+        if scan_result is None:
+            scan_result = pdf_scanner.scan_pdf(file_path)
+            if scan_result.get('status') == 'success':
+                try:
+                    get_redis().set(cache_key, json.dumps(scan_result), ex=SCAN_CACHE_TTL)
+                except redis.RedisError as cache_error:
+                    logger.warning("Scan cache unavailable: %s", cache_error)
         processing_time_ms = int((time.time() - start_time) * 1000)
         
         # Determine success
@@ -63,15 +209,10 @@ def process_pdf_async(self, file_path: str, document_id: str, filename: str) ->
         
         # Store results in database (with connection retry)
         if success:
-            self.update_state(state='PROGRESS', meta={'status': 'Storing results in database'})
-            
-            try:
-                if not db.client:
-                    db.connect()
-                db.store_scan_result(document_id, filename, scan_result, processing_time_ms)
-            except Exception as db_error:
+            if not db.client:
+                db.connect()
+            if not db.store_scan_result(document_id, filename, scan_result, processing_time_ms):
                 metrics_collector.record_error("database_error", "async_scan")
-                print(f"Database error in async task: {db_error}")
         
         # End metrics tracking
         if operation_id:
@@ -92,6 +233,8 @@ def process_pdf_async(self, file_path: str, document_id: str, filename: str) ->
             'task_id': self.request.id
         }
         
+        store_document_result('scan', document_id, result)
+        
         self.update_state(
             state='SUCCESS', 
             meta={
@@ -105,6 +248,7 @@ def process_pdf_async(self, file_path: str, document_id: str, filename: str) ->
     except SoftTimeLimitExceeded:
         if operation_id:
             metrics_collector.end_operation(operation_id, success=False, error_type="timeout")
+        release_document('scan', document_id, self.request.id)
         
         self.update_state(
             state='FAILURE',
@@ -118,18 +262,19 @@ def process_pdf_async(self, file_path: str, document_id: str, filename: str) ->
     except Exception as e:
         if operation_id:
             metrics_collector.end_operation(operation_id, success=False, error_type="unknown_error")
+        release_document('scan', document_id, self.request.id)
         
-        error_trace = traceback.format_exc()
-        print(f"Error in async PDF processing: {error_trace}")
+        logger.exception("Error in async PDF processing", extra={'document_id': document_id})
         
-        self.update_state(
-            state='FAILURE',
-            meta={
-                'status': 'Processing failed',
-                'error': str(e),
-                'traceback': error_trace
-            }
-        )
+        meta = {
+            'status': 'Processing failed',
+            'error': str(e)
+        }
+        # Formatting the traceback again walks every frame; only pay for it when debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            meta['traceback'] = traceback.format_exc()
+        
+        self.update_state(state='FAILURE', meta=meta)
         raise
 
 
@@ -149,21 +294,36 @@ def process_pdf_scan_redact_async(self, file_path: str, document_id: str, filena
     """
     operation_id = None
     
+    # Redelivered tasks return the result of the run that already finished, and wait
+    # for one still in progress rather than scanning the document a second time
+    claimed, previous_result = claim_document('scan_redact', document_id, self.request.id)
+    if previous_result is not None:
+        return previous_result
+    if not claimed:
+        raise self.retry(countdown=CLAIM_RETRY_SECONDS, max_retries=CLAIM_MAX_RETRIES)
+    
     try:
-        # Update task state
+        # Only the start and the outcome are written to the result backend; the
+        # steps in between are too short to be worth a round-trip each
         self.update_state(state='PROGRESS', meta={'status': 'Starting PDF scan and redaction'})
         
-        # Get file size for metrics
-        file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        # One stat gives both the file size for metrics and the existence check
+        try:
+            file_size = os.stat(file_path).st_size
+        except FileNotFoundError:
+            file_size = None
         
         # Start metrics tracking
-        operation_id = metrics_collector.start_operation(document_id, "async_scan_redact", file_size)
+        operation_id = metrics_collector.start_operation(document_id, "async_scan_redact", file_size or 0)
         
         # Validate PDF exists
-        if not os.path.exists(file_path):
+        if file_size is None:
             raise FileNotFoundError(f"PDF file not found: {file_path}")
         
-        self.update_state(state='PROGRESS', meta={'status': 'Scanning and redacting PDF'})
+        # Misnamed or empty uploads fail here in microseconds, not after a full scan
+        if not has_pdf_header(file_path, file_size):
+            return invalid_pdf_result('scan_redact', "async_scan_redact", operation_id, self.request.id,
+                                      document_id, filename, file_size)
         
         # Process the PDF
         start_time = time.time()
@@ -181,15 +341,10 @@ def process_pdf_scan_redact_async(self, file_path: str, document_id: str, filena
         
         # Store results in database (with connection retry)
         if success:
-            self.update_state(state='PROGRESS', meta={'status': 'Storing results in database'})
-            
-            try:
-                if not db.client:
-                    db.connect()
-                db.store_scan_result(document_id, filename, scan_redact_result, processing_time_ms)
-            except Exception as db_error:
+            if not db.client:
+                db.connect()
+            if not db.store_scan_result(document_id, filename, scan_redact_result, processing_time_ms):
                 metrics_collector.record_error("database_error", "async_scan_redact")
-                print(f"Database error in async task: {db_error}")
         
         # End metrics tracking
         if operation_id:
@@ -211,6 +366,8 @@ def process_pdf_scan_redact_async(self, file_path: str, document_id: str, filena
             'task_id': self.request.id
         }
         
+        store_document_result('scan_redact', document_id, result)
+        
         self.update_state(
             state='SUCCESS',
             meta={
@@ -224,6 +381,7 @@ def process_pdf_scan_redact_async(self, file_path: str, document_id: str, filena
     except SoftTimeLimitExceeded:
         if operation_id:
             metrics_collector.end_operation(operation_id, success=False, error_type="timeout")
+        release_document('scan_redact', document_id, self.request.id)
         
         self.update_state(
             state='FAILURE',
@@ -237,21 +395,30 @@ def process_pdf_scan_redact_async(self, file_path: str, document_id: str, filena
     except Exception as e:
         if operation_id:
             metrics_collector.end_operation(operation_id, success=False, error_type="unknown_error")
+        release_document('scan_redact', document_id, self.request.id)
         
-        error_trace = traceback.format_exc()
-        print(f"Error in async PDF scan/redact processing: {error_trace}")
+        logger.exception("Error in async PDF scan/redact processing", extra={'document_id': document_id})
         
-        self.update_state(
-            state='FAILURE',
-            meta={
-                'status': 'Processing failed',
-                'error': str(e),
-                'traceback': error_trace
-            }
-        )
+        meta = {
+            'status': 'Processing failed',
+            'error': str(e)
+        }
+        # Formatting the traceback again walks every frame; only pay for it when debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            meta['traceback'] = traceback.format_exc()
+        
+        self.update_state(state='FAILURE', meta=meta)
         raise
 
 
+def _remove_file(file_path: str):
+    """Remove one file, returning (file_path, removed, error)."""
+    try:
+        return file_path, remove_file_if_present(file_path), None
+    except Exception as e:
+        return file_path, False, str(e)
+
+
 @celery_app.task(name='backend.celery_tasks.cleanup_temp_files')
 def cleanup_temp_files(file_paths: list) -> Dict[str, Any]:
     """
@@ -266,13 +433,13 @@ def cleanup_temp_files(file_paths: list) -> Dict[str, Any]:
     cleaned_files = []
     failed_cleanups = []
     
-    for file_path in file_paths:
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
+    # Unlinks are independent syscalls; overlap them for large batches
+    with ThreadPoolExecutor(max_workers=max(1, min(16, len(file_paths)))) as executor:
+        for file_path, removed, error in executor.map(_remove_file, file_paths):
+            if removed:
                 cleaned_files.append(file_path)
-        except Exception as e:
-            failed_cleanups.append({'file': file_path, 'error': str(e)})
+            elif error is not None:
+                failed_cleanups.append({'file': file_path, 'error': error})
     
     return {
         'cleaned_files': cleaned_files,
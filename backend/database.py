@@ -1,13 +1,64 @@
 import clickhouse_connect
-from datetime import datetime
+from clickhouse_connect.driver.exceptions import DatabaseError
+import urllib3
 from typing import List, Dict, Any, Optional
 import json
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Longest wait between flush retries while ClickHouse is unavailable
+MAX_FLUSH_BACKOFF_SECONDS = 30.0
+
+# Start of the documents_stats_mv window is set this far ahead of the server clock, so
+# no row in the window can have been inserted before the view existed
+STATS_VIEW_LEAD_SECONDS = 5
+# Wait past the window start before backfilling, for inserts stamped just before it
+# (including async_insert buffers) to be written
+STATS_BACKFILL_SETTLE_SECONDS = 5
+
+# Insert column order for the buffered, column-oriented writes; findings are
+# stored with their document as the parallel arrays of a Nested column.
+# processed_at is left to the server, which stamps each row as it is inserted
+DOCUMENT_COLUMNS = [
+    'id', 'filename', 'file_size', 'total_pages',
+    'status', 'error_message', 'findings_count', 'processing_time_ms',
+    'findings.type', 'findings.value', 'findings.page',
+    'findings.position_start', 'findings.position_end'
+]
+
+# Arrow schemas matching the table definitions, so nothing is inferred per batch
+if pa is not None:
+    DOCUMENT_SCHEMA = pa.schema([
+        ('id', pa.string()),
+        ('filename', pa.string()),
+        ('file_size', pa.uint64()),
+        ('total_pages', pa.uint32()),
+        ('status', pa.string()),
+        ('error_message', pa.string()),
+        ('findings_count', pa.uint32()),
+        ('processing_time_ms', pa.uint32()),
+        ('findings.type', pa.list_(pa.string())),
+        ('findings.value', pa.list_(pa.string())),
+        ('findings.page', pa.list_(pa.uint32())),
+        ('findings.position_start', pa.list_(pa.uint32())),
+        ('findings.position_end', pa.list_(pa.uint32()))
+    ])
+
 class ClickHouseDB:
+    _schema_ready = False  # Database and tables are created once per process
+    
     def __init__(self):
         self.host = os.getenv('CLICKHOUSE_HOST', 'localhost')
         self.port = int(os.getenv('CLICKHOUSE_PORT', 8123))
@@ -15,154 +66,376 @@ class ClickHouseDB:
         self.password = os.getenv('CLICKHOUSE_PASSWORD', '')
         self.database = os.getenv('CLICKHOUSE_DATABASE', 'pdf_scanner')
         self.client = None
+        self._pool_manager = urllib3.PoolManager(maxsize=32)
+        
+        # Let the server batch the many small per-document inserts into larger parts.
+        # Inserts are acknowledged once buffered in memory, before they reach disk,
+        # so a server crash can lose the last busy_timeout worth of rows
+        self.insert_settings = {
+            'async_insert': 1,
+            'wait_for_async_insert': 0,
+            'async_insert_busy_timeout_ms': 1000,
+            'async_insert_max_data_size': 10_000_000
+        }
+        
+        # Client-side write buffer: rows from many scans are flushed together by a
+        # background thread every CH_FLUSH_INTERVAL seconds or once CH_FLUSH_ROWS pile up
+        self.flush_interval_seconds = float(os.getenv('CH_FLUSH_INTERVAL', 0.5))
+        self.flush_rows = int(os.getenv('CH_FLUSH_ROWS', 10000))
+        # Rows kept for retry while inserts fail; the oldest are dropped beyond this
+        self.max_buffered_rows = int(os.getenv('CH_MAX_BUFFERED_ROWS', self.flush_rows * 10))
+        self._pending_documents = [[] for _ in DOCUMENT_COLUMNS]
+        self._buffer_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flush_thread = None
+
+    def _get_client(self, database: Optional[str] = None):
+        """Create a client sharing one HTTP connection pool across threads."""
+        return clickhouse_connect.get_client(
+            host=self.host,
+            port=self.port,
+            username=self.user,
+            password=self.password,
+            database=database,
+            pool_mgr=self._pool_manager,
+            # Session ids serialize queries per session; the flush thread and
+            # request threads share this client concurrently
+            autogenerate_session_id=False
+        )
+
+    def _ensure_database(self):
+        """Create the database on first connect in this process."""
+        if ClickHouseDB._schema_ready:
+            return
+        
+        bootstrap_client = self._get_client()
+        try:
+            bootstrap_client.command(f'CREATE DATABASE IF NOT EXISTS {self.database}')
+        finally:
+            bootstrap_client.close()
 
     def connect(self):
         """Connect to ClickHouse database."""
         try:
-            self.client = clickhouse_connect.get_client(
-                host=self.host,
-                port=self.port,
-                username=self.user,
-                password=self.password
-            )
-            
-            # Create database if it doesn't exist
-            self.client.command(f'CREATE DATABASE IF NOT EXISTS {self.database}')
-            
-            # Switch to the database
-            self.client = clickhouse_connect.get_client(
-                host=self.host,
-                port=self.port,
-                username=self.user,
-                password=self.password,
-                database=self.database
-            )
+            self._ensure_database()
+            self.client = self._get_client(self.database)
             
             # Create tables
-            self._create_tables()
+            if not ClickHouseDB._schema_ready:
+                self._create_tables()
+                ClickHouseDB._schema_ready = True
             return True
             
         except Exception as e:
-            print(f"Error connecting to ClickHouse: {e}")
+            logger.error("Error connecting to ClickHouse: %s", e)
             return False
 
     def _create_tables(self):
         """Create necessary tables."""
         
-        # Main documents table
-        create_documents_table = """
+        # Documents table; each document's findings are stored in the same row
+        findings_column = """findings Nested(
+            type String,
+            value String,
+            page UInt32,
+            position_start Nullable(UInt32),
+            position_end Nullable(UInt32)
+        )"""
+        create_documents_table = f"""
         CREATE TABLE IF NOT EXISTS documents (
             id String,
             filename String,
             file_size UInt64,
             total_pages UInt32,
-            processed_at DateTime,
+            processed_at DateTime DEFAULT now(),
             status String,
             error_message String,
             findings_count UInt32,
-            processing_time_ms UInt32
+            processing_time_ms UInt32,
+            {findings_column},
+            INDEX idx_id id TYPE bloom_filter GRANULARITY 4
         ) ENGINE = MergeTree()
-        ORDER BY processed_at
+        PARTITION BY toYYYYMM(processed_at)
+        ORDER BY (processed_at, id)
         """
         
-        # Findings table
-        create_findings_table = """
-        CREATE TABLE IF NOT EXISTS findings (
-            document_id String,
-            finding_type String,
-            finding_value String,
-            page_number UInt32,
-            position_start Nullable(UInt32),
-            position_end Nullable(UInt32),
-            detected_at DateTime
-        ) ENGINE = MergeTree()
-        ORDER BY (document_id, detected_at)
+        # Running aggregates of successful documents, maintained incrementally by
+        # documents_stats_mv so get_stats reads a few partial states, not every row
+        create_stats_table = """
+        CREATE TABLE IF NOT EXISTS documents_stats (
+            total_documents AggregateFunction(count),
+            total_findings AggregateFunction(sum, UInt32),
+            avg_processing_time AggregateFunction(avg, UInt32),
+            p95_processing_time AggregateFunction(quantile(0.95), UInt32),
+            total_file_size AggregateFunction(sum, UInt64)
+        ) ENGINE = AggregatingMergeTree()
+        ORDER BY tuple()
+        """
+        
+        stats_select = """
+        SELECT 
+            countState() as total_documents,
+            sumState(findings_count) as total_findings,
+            avgState(processing_time_ms) as avg_processing_time,
+            quantileState(0.95)(processing_time_ms) as p95_processing_time,
+            sumState(file_size) as total_file_size
+        FROM documents
+        WHERE status = 'success'
         """
         
         self.client.command(create_documents_table)
-        self.client.command(create_findings_table)
+        
+        # Tables created before the id index and findings column existed get them too;
+        # lookups by document id skip granules whose bloom filter rules the id out
+        self.client.command('ALTER TABLE documents MODIFY COLUMN processed_at DateTime DEFAULT now()')
+        self.client.command('ALTER TABLE documents ADD INDEX IF NOT EXISTS idx_id id TYPE bloom_filter GRANULARITY 4')
+        self.client.command(f'ALTER TABLE documents ADD COLUMN IF NOT EXISTS {findings_column}')
+        self._migrate_findings_table()
+        
+        self.client.command(create_stats_table)
+        if self.client.command('EXISTS TABLE documents_stats_mv'):
+            return
+        
+        # The view counts rows stamped from a boundary a little ahead of the server clock
+        # and the backfill counts those before it, so each row is counted exactly once;
+        # processed_at is server-assigned, so buffered rows and client clocks cannot cross it
+        server_now = int(self.client.command('SELECT toUnixTimestamp(now())'))
+        boundary = server_now + STATS_VIEW_LEAD_SECONDS
+        try:
+            self.client.command(
+                f'CREATE MATERIALIZED VIEW documents_stats_mv TO documents_stats AS '
+                f'{stats_select} AND processed_at >= toDateTime({boundary})'
+            )
+        except DatabaseError:
+            if self.client.command('EXISTS TABLE documents_stats_mv'):
+                # Another process created the view first and does the backfill
+                return
+            raise
+        
+        # Only the process that created the view folds in documents stored before it
+        time.sleep(STATS_VIEW_LEAD_SECONDS + STATS_BACKFILL_SETTLE_SECONDS)
+        self.client.command(f'INSERT INTO documents_stats {stats_select} AND processed_at < toDateTime({boundary})')
+
+    def _migrate_findings_table(self):
+        """
+        Copy findings from the separate findings table of earlier versions into the
+        Nested column of their document rows, then rename it to findings_migrated.
+        """
+        if not self.client.command('EXISTS TABLE findings'):
+            return
+        
+        # Creating the lookup table is the lock: only the process that creates it migrates.
+        # A run interrupted part way leaves it behind; drop it to run the migration again
+        try:
+            self.client.command("""
+            CREATE TABLE findings_migration (
+                document_id String,
+                type Array(String),
+                value Array(String),
+                page Array(UInt32),
+                position_start Array(Nullable(UInt32)),
+                position_end Array(Nullable(UInt32))
+            ) ENGINE = Join(ANY, LEFT, document_id)
+            """)
+        except DatabaseError:
+            if self.client.command('EXISTS TABLE findings_migration'):
+                logger.info("Findings table migration already started by another process")
+                return
+            raise
+        
+        logger.info("Migrating the findings table into documents.findings")
+        # Each document's findings in page order; the tuples keep the parallel arrays
+        # aligned, which separate groupArray calls would not, as they skip NULL positions
+        self.client.command("""
+        INSERT INTO findings_migration
+        SELECT
+            document_id,
+            arrayMap(f -> f.3, rows) AS type,
+            arrayMap(f -> f.4, rows) AS value,
+            arrayMap(f -> f.1, rows) AS page,
+            arrayMap(f -> f.2, rows) AS position_start,
+            arrayMap(f -> f.5, rows) AS position_end
+        FROM (
+            SELECT
+                document_id,
+                arraySort(groupArray((page_number, position_start, finding_type, finding_value, position_end))) AS rows
+            FROM findings
+            GROUP BY document_id
+        )
+        """)
+        # Only rows stored before the Nested column existed have findings but empty arrays
+        self.client.command(
+            """
+            ALTER TABLE documents UPDATE
+                findings.type = joinGet('findings_migration', 'type', id),
+                findings.value = joinGet('findings_migration', 'value', id),
+                findings.page = joinGet('findings_migration', 'page', id),
+                findings.position_start = joinGet('findings_migration', 'position_start', id),
+                findings.position_end = joinGet('findings_migration', 'position_end', id)
+            WHERE findings_count > 0 AND empty(findings.type)
+            """,
+            settings={'mutations_sync': 2, 'allow_nondeterministic_mutations': 1}
+        )
+        self.client.command('RENAME TABLE findings TO findings_migrated')
+        self.client.command('DROP TABLE findings_migration')
+        logger.info("Findings table migrated; the old rows are kept in findings_migrated")
 
     def store_scan_result(self, document_id: str, filename: str, scan_result: Dict[str, Any], processing_time_ms: int) -> bool:
-        """Store PDF scan results in the database."""
+        """
+        Queue PDF scan results for storage in the database.
+        Rows are buffered and written in batches by the flush thread; call flush()
+        before shutdown to write anything still pending. Returns False when there is
+        no database connection to write them to.
+        """
+        if self.client is None:
+            logger.error("Not storing scan result for %s: not connected to ClickHouse", document_id)
+            return False
+        
         try:
-            # Insert document record
-            document_data = {
-                'id': document_id,
-                'filename': filename,
-                'file_size': scan_result.get('file_size', 0),
-                'total_pages': scan_result.get('total_pages', 0),
-                'processed_at': datetime.now(),
-                'status': scan_result.get('status', 'unknown'),
-                'error_message': scan_result.get('error', ''),
-                'findings_count': scan_result.get('findings_count', 0),
-                'processing_time_ms': processing_time_ms
-            }
+            # Document record with its findings as parallel arrays, in DOCUMENT_COLUMNS order
+            findings = scan_result.get('findings') or []
+            document_row = (
+                document_id,
+                filename,
+                scan_result.get('file_size', 0),
+                scan_result.get('total_pages', 0),
+                scan_result.get('status', 'unknown'),
+                scan_result.get('error', ''),
+                scan_result.get('findings_count', 0),
+                processing_time_ms,
+                [finding['type'] for finding in findings],
+                [finding['value'] for finding in findings],
+                [finding['page'] for finding in findings],
+                [finding.get('position', {}).get('start') for finding in findings],
+                [finding.get('position', {}).get('end') for finding in findings]
+            )
             
-            self.client.insert('documents', [document_data])
+            with self._buffer_lock:
+                for column, value in zip(self._pending_documents, document_row):
+                    column.append(value)
+                buffered_rows = len(self._pending_documents[0])
             
-            # Insert findings if any
-            if scan_result.get('findings'):
-                findings_data = []
-                current_time = datetime.now()
-                
-                for finding in scan_result['findings']:
-                    finding_record = {
-                        'document_id': document_id,
-                        'finding_type': finding['type'],
-                        'finding_value': finding['value'],
-                        'page_number': finding['page'],
-                        'position_start': finding.get('position', {}).get('start'),
-                        'position_end': finding.get('position', {}).get('end'),
-                        'detected_at': current_time
-                    }
-                    findings_data.append(finding_record)
-                
-                self.client.insert('findings', findings_data)
+            self._ensure_flush_thread()
+            if buffered_rows >= self.flush_rows:
+                self._flush_event.set()
+            
+            return True
+            
+        except Exception as e:
+            logger.error("Error storing scan result: %s", e)
+            return False
+
+    def _ensure_flush_thread(self):
+        """Start the flush thread on first use, in the process that buffers rows."""
+        if self._flush_thread is None or not self._flush_thread.is_alive():
+            with self._buffer_lock:
+                if self._flush_thread is None or not self._flush_thread.is_alive():
+                    self._flush_thread = threading.Thread(
+                        target=self._flush_loop,
+                        name="clickhouse_flush",
+                        daemon=True
+                    )
+                    self._flush_thread.start()
+
+    def _flush_loop(self):
+        """Flush buffered rows on the interval, or early when the row threshold is hit."""
+        backoff_seconds = self.flush_interval_seconds
+        while True:
+            self._flush_event.wait(self.flush_interval_seconds)
+            self._flush_event.clear()
+            if self.flush():
+                backoff_seconds = self.flush_interval_seconds
+            else:
+                # Failed rows stay buffered; back off rather than retrying on every new row
+                time.sleep(backoff_seconds)
+                backoff_seconds = min(backoff_seconds * 2, MAX_FLUSH_BACKOFF_SECONDS)
+
+    def flush(self) -> bool:
+        """
+        Write all buffered documents, findings included, in one column-oriented insert.
+        A batch that fails to insert is put back in front of the buffer for the next flush.
+        """
+        with self._buffer_lock:
+            documents_batch = self._pending_documents
+            self._pending_documents = [[] for _ in DOCUMENT_COLUMNS]
+        
+        document_count = len(documents_batch[0])
+        if not document_count:
+            return True
+        
+        try:
+            if self.client is None and not self.connect():
+                raise ConnectionError("not connected to ClickHouse")
             
+            if pa is not None:
+                # Arrow batches are sent as-is, skipping the driver's per-value serialization
+                self.client.insert_arrow('documents', pa.Table.from_arrays(documents_batch, schema=DOCUMENT_SCHEMA),
+                                         settings=self.insert_settings)
+            else:
+                # Columns go to the driver as-is, with no per-row transposition
+                self.client.insert('documents', documents_batch, column_names=DOCUMENT_COLUMNS,
+                                   column_oriented=True, settings=self.insert_settings)
             return True
             
         except Exception as e:
-            print(f"Error storing scan result: {e}")
+            logger.error("Error flushing %d documents, keeping them for retry: %s", document_count, e)
+            self._requeue(documents_batch)
             return False
 
+    def _requeue(self, documents_batch: List[list]):
+        """Put a failed batch back ahead of rows buffered since, dropping the oldest past max_buffered_rows."""
+        with self._buffer_lock:
+            self._pending_documents = [
+                failed + pending for failed, pending in zip(documents_batch, self._pending_documents)
+            ]
+            excess = len(self._pending_documents[0]) - self.max_buffered_rows
+            if excess > 0:
+                self._pending_documents = [column[excess:] for column in self._pending_documents]
+        
+        if excess > 0:
+            logger.error("Write buffer full; dropped the %d oldest scan results", excess)
+
     def get_findings(self, limit: int = 100, document_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Retrieve findings from the database."""
+        """
+        Retrieve findings from the database.
+        Findings are stored in each document row, so one query with no join returns both.
+        """
         try:
             if document_id:
                 query = """
                 SELECT 
-                    d.id,
-                    d.filename,
-                    d.processed_at,
-                    d.status,
-                    d.findings_count,
-                    d.total_pages,
-                    d.file_size,
-                    d.processing_time_ms,
-                    groupArray(tuple(f.finding_type, f.finding_value, f.page_number)) as findings
-                FROM documents d
-                LEFT JOIN findings f ON d.id = f.document_id
-                WHERE d.id = %(document_id)s
-                GROUP BY d.id, d.filename, d.processed_at, d.status, d.findings_count, d.total_pages, d.file_size, d.processing_time_ms
-                ORDER BY d.processed_at DESC
+                    id,
+                    filename,
+                    processed_at,
+                    status,
+                    findings_count,
+                    total_pages,
+                    file_size,
+                    processing_time_ms,
+                    findings.type,
+                    findings.value,
+                    findings.page
+                FROM documents
+                WHERE id = %(document_id)s
+                ORDER BY processed_at DESC
                 """
                 params = {'document_id': document_id}
             else:
                 query = """
                 SELECT 
-                    d.id,
-                    d.filename,
-                    d.processed_at,
-                    d.status,
-                    d.findings_count,
-                    d.total_pages,
-                    d.file_size,
-                    d.processing_time_ms,
-                    groupArray(tuple(f.finding_type, f.finding_value, f.page_number)) as findings
-                FROM documents d
-                LEFT JOIN findings f ON d.id = f.document_id
-                GROUP BY d.id, d.filename, d.processed_at, d.status, d.findings_count, d.total_pages, d.file_size, d.processing_time_ms
-                ORDER BY d.processed_at DESC
+                    id,
+                    filename,
+                    processed_at,
+                    status,
+                    findings_count,
+                    total_pages,
+                    file_size,
+                    processing_time_ms,
+                    findings.type,
+                    findings.value,
+                    findings.page
+                FROM documents
+                ORDER BY processed_at DESC
                 LIMIT %(limit)s
                 """
                 params = {'limit': limit}
@@ -180,25 +453,17 @@ class ClickHouseDB:
                     'total_pages': row[5],
                     'file_size': row[6],
                     'processing_time_ms': row[7],
-                    'findings': []
+                    'findings': [
+                        {'type': finding_type, 'value': finding_value, 'page': page}
+                        for finding_type, finding_value, page in zip(row[8], row[9], row[10])
+                    ]
                 }
-                
-                # Parse findings
-                if row[8] and row[8][0] != ('', '', 0):  # Check if findings exist
-                    for finding_tuple in row[8]:
-                        if finding_tuple[0]:  # Check if finding_type is not empty
-                            doc['findings'].append({
-                                'type': finding_tuple[0],
-                                'value': finding_tuple[1],
-                                'page': finding_tuple[2]
-                            })
-                
                 documents.append(doc)
             
             return documents
             
         except Exception as e:
-            print(f"Error retrieving findings: {e}")
+            logger.error("Error retrieving findings: %s", e)
             return []
 
     def get_stats(self) -> Dict[str, Any]:
@@ -206,13 +471,12 @@ class ClickHouseDB:
         try:
             stats_query = """
             SELECT 
-                count() as total_documents,
-                sum(findings_count) as total_findings,
-                avg(processing_time_ms) as avg_processing_time,
-                quantile(0.95)(processing_time_ms) as p95_processing_time,
-                sum(file_size) as total_file_size
-            FROM documents
-            WHERE status = 'success'
+                countMerge(total_documents) as total_documents,
+                sumMerge(total_findings) as total_findings,
+                avgMerge(avg_processing_time) as avg_processing_time,
+                quantileMerge(0.95)(p95_processing_time) as p95_processing_time,
+                sumMerge(total_file_size) as total_file_size
+            FROM documents_stats
             """
             
             result = self.client.query(stats_query)
@@ -227,7 +491,7 @@ class ClickHouseDB:
             }
             
         except Exception as e:
-            print(f"Error getting stats: {e}")
+            logger.error("Error getting stats: %s", e)
             return {}
 
     def health_check(self) -> bool:
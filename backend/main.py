@@ -8,15 +8,19 @@ import uuid
 import time
 import shutil
 import asyncio
-from typing import List
+from collections import OrderedDict
+from typing import List, Optional
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from pdf_scanner import PDFScanner
+from pdf_scanner import PDFScanner, Finding, remove_file_if_present, init_document_worker, scan_pdf_in_worker, scan_and_redact_pdf_in_worker
 from database import ClickHouseDB
 from metrics import metrics_collector
 from prometheus_metrics import prometheus_metrics
@@ -28,32 +32,98 @@ load_dotenv()
 pdf_scanner = PDFScanner()
 db = ClickHouseDB()
 
-# Thread pool for PDF processing - optimized for multi-worker deployment
-# Each worker gets its own thread pool for CPU-intensive tasks
-PDF_PROCESSING_POOL = ThreadPoolExecutor(
-    max_workers=min(8, os.cpu_count() or 1),  # Limit per worker to avoid resource contention
-    thread_name_prefix="pdf_processor"
-)
+# Process pool for PDF processing - optimized for multi-worker deployment
+# Scanning and redaction are CPU-bound Python that threads would serialize on the
+# GIL; forkserver starts workers from a clean process rather than forking this one
+def create_pdf_processing_pool(max_workers: int = min(8, os.cpu_count() or 1)) -> ProcessPoolExecutor:
+    """Create a process pool that runs PDF scans and redactions."""
+    return ProcessPoolExecutor(
+        max_workers=max_workers,  # Limit per worker to avoid resource contention
+        mp_context=multiprocessing.get_context("forkserver"),
+        initializer=init_document_worker  # Build the scanner before the first request needs it
+    )
+
+PDF_PROCESSING_POOL = create_pdf_processing_pool()
+PDF_PROCESSING_POOL_LOCK = threading.Lock()
+
+# Single-worker pool shared by the retries of tasks a broken pool failed, started on
+# the first break; a PDF that crashes again breaks only this pool, not the main one.
+# Retries are submitted one at a time, so a break fails only the retry that caused it
+PDF_RETRY_POOL = None
+PDF_RETRY_LOCK = asyncio.Lock()
+
+def replace_broken_pool(broken_pool: ProcessPoolExecutor) -> ProcessPoolExecutor:
+    """Swap in a fresh pool for one broken by a dead worker, unless another request already has."""
+    global PDF_PROCESSING_POOL
+    with PDF_PROCESSING_POOL_LOCK:
+        if PDF_PROCESSING_POOL is broken_pool:
+            print("PDF processing pool broken by a dead worker; starting a new pool")
+            broken_pool.shutdown(wait=False, cancel_futures=True)
+            PDF_PROCESSING_POOL = create_pdf_processing_pool()
+        return PDF_PROCESSING_POOL
+
+def get_retry_pool(broken_pool: Optional[ProcessPoolExecutor] = None) -> ProcessPoolExecutor:
+    """Get the shared retry pool, replacing it first if broken_pool is the current one."""
+    global PDF_RETRY_POOL
+    with PDF_PROCESSING_POOL_LOCK:
+        if PDF_RETRY_POOL is not None and PDF_RETRY_POOL is broken_pool:
+            broken_pool.shutdown(wait=False, cancel_futures=True)
+            PDF_RETRY_POOL = None
+        if PDF_RETRY_POOL is None:
+            PDF_RETRY_POOL = create_pdf_processing_pool(max_workers=1)
+        return PDF_RETRY_POOL
+
+async def run_in_pdf_pool(func, file_path: str):
+    """
+    Run func(file_path) in the PDF process pool.
+    A worker that crashes (segfault, OOM kill) breaks the whole pool and fails every
+    task in it. The pool is replaced, and each failed task is retried once, one at a
+    time, in the shared retry pool, so a PDF that crashes again cannot take down the
+    replacement pool and every new request running in it.
+    """
+    loop = asyncio.get_running_loop()
+    pool = PDF_PROCESSING_POOL
+    try:
+        return await loop.run_in_executor(pool, func, file_path)
+    except BrokenProcessPool:
+        replace_broken_pool(pool)
+    
+    async with PDF_RETRY_LOCK:
+        retry_pool = get_retry_pool()
+        try:
+            return await loop.run_in_executor(retry_pool, func, file_path)
+        except BrokenProcessPool:
+            # Replace it for the retries still to come; this task is not retried again
+            get_retry_pool(retry_pool)
+            raise
+
+# Multi-worker deployment provides I/O parallelism + process pool per worker
 
-# Multi-worker deployment provides I/O parallelism + thread pool per worker
+def count_pool_workers() -> int:
+    """Count live worker processes; they are started on demand, up to max_workers."""
+    processes = PDF_PROCESSING_POOL._processes or {}
+    return len([p for p in processes.values() if p.is_alive()])
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database connection and thread pool on startup."""
+    """Initialize database connection and process pool on startup."""
     global redis_client
     
     success = db.connect()
     if not success:
         print("Warning: Could not connect to ClickHouse database")
     
-    print(f"Started PDF processing thread pool with {PDF_PROCESSING_POOL._max_workers} workers per FastAPI worker")
+    print(f"Started PDF processing process pool with {PDF_PROCESSING_POOL._max_workers} workers per FastAPI worker")
     
-    # Using multi-worker deployment for I/O parallelism + thread pools for CPU work
+    # Using multi-worker deployment for I/O parallelism + process pools for CPU work
     
     yield
     
     # Cleanup connections on shutdown
-    PDF_PROCESSING_POOL.shutdown(wait=True)
+    PDF_PROCESSING_POOL.shutdown(wait=True, cancel_futures=True)
+    if PDF_RETRY_POOL is not None:
+        PDF_RETRY_POOL.shutdown(wait=True, cancel_futures=True)
+    db.flush()  # Write scan results still buffered
     print("Shutdown complete")
 
 app = FastAPI(title="PDF Sensitive Data Scanner", lifespan=lifespan)
@@ -77,19 +147,57 @@ app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 10485760))  # 10MB default
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Original filenames of redacted documents, so downloads skip the database lookup.
+# Per worker and bounded; a miss falls back to the database
+REDACTED_FILENAMES_MAX = 10000
+redacted_filenames = OrderedDict()
+
+def remember_redacted_filename(document_id: str, filename: str):
+    """Record a redacted document's original filename, evicting the oldest entry when full."""
+    redacted_filenames[document_id] = filename
+    if len(redacted_filenames) > REDACTED_FILENAMES_MAX:
+        redacted_filenames.popitem(last=False)
+
+@asynccontextmanager
+async def temp_upload(document_id: str):
+    """Yield the temporary path for an upload, removing the file however the block exits."""
+    file_path = os.path.join(UPLOAD_DIR, f"{document_id}.pdf")
+    try:
+        yield file_path
+    finally:
+        remove_file_if_present(file_path)
+
+def save_upload(source, file_path: str) -> int:
+    """
+    Copy an upload to disk in chunks, stopping once it exceeds MAX_FILE_SIZE.
+    Returns the number of bytes written, which is more than MAX_FILE_SIZE when too large.
+    """
+    written = 0
+    with open(file_path, "wb") as f:
+        while written <= MAX_FILE_SIZE:
+            chunk = source.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+# Pages are read once at startup rather than from disk on every request
+with open(os.path.join(STATIC_DIR, "index.html"), "rb") as f:
+    INDEX_HTML = f.read()
+with open(os.path.join(STATIC_DIR, "metrics.html"), "rb") as f:
+    METRICS_HTML = f.read()
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
-    index_path = os.path.join(STATIC_DIR, "index.html")
-    with open(index_path, "r") as f:
-        return f.read()
+    return HTMLResponse(content=INDEX_HTML)
 
 @app.get("/metrics-dashboard", response_class=HTMLResponse)
 async def metrics_dashboard():
     """Serve the metrics dashboard."""
-    metrics_path = os.path.join(STATIC_DIR, "metrics.html")
-    with open(metrics_path, "r") as f:
-        return f.read()
+    return HTMLResponse(content=METRICS_HTML)
 
 @app.get("/health")
 async def health_check():
@@ -111,82 +219,62 @@ async def upload_file(file: UploadFile = File(...)):
     document_id = str(uuid.uuid4())
     
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Check file size
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413, 
-                detail=f"File too large. Maximum size is {MAX_FILE_SIZE} bytes"
-            )
-        
-        # Save file temporarily
-        file_path = os.path.join(UPLOAD_DIR, f"{document_id}.pdf")
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        # Validate PDF
-        if not pdf_scanner.is_valid_pdf(file_path):
-            os.remove(file_path)
-            raise HTTPException(status_code=400, detail="Invalid PDF file")
-        
-        # Scan the PDF using thread pool for CPU-intensive work
-        start_time = time.time()
-        loop = asyncio.get_event_loop()
-        scan_result = await loop.run_in_executor(
-            PDF_PROCESSING_POOL, 
-            pdf_scanner.scan_pdf, 
-            file_path
-        )
-        processing_time_ms = int((time.time() - start_time) * 1000)
-        
-        # Record Prometheus metrics
-        prometheus_metrics.record_request("scan", "success" if scan_result["status"] == "success" else "error")
-        prometheus_metrics.record_processing_time("scan", (time.time() - start_time))
-        prometheus_metrics.record_file_size(len(content))
-        if scan_result["status"] == "success":
-            prometheus_metrics.record_pages_processed(scan_result.get("total_pages", 0))
-            for finding in scan_result.get("findings", []):
-                prometheus_metrics.record_findings(finding.get("type", "unknown"))
-        
-        # Store results in database
-        db.store_scan_result(document_id, file.filename, scan_result, processing_time_ms)
-        
-        # Clean up temporary file
-        os.remove(file_path)
-        
-        # Prepare response
-        response = {
-            "document_id": document_id,
-            "filename": file.filename,
-            "status": scan_result["status"],
-            "processing_time_ms": processing_time_ms
-        }
-        
-        if scan_result["status"] == "success":
-            response.update({
-                "findings": scan_result["findings"],
-                "findings_count": scan_result["findings_count"],
-                "total_pages": scan_result["total_pages"],
-                "file_size": scan_result["file_size"]
-            })
-        elif scan_result["status"] == "error":
-            response["error"] = scan_result["error"]
-        
-        return response
+        # The temporary file is removed however the request ends
+        async with temp_upload(document_id) as file_path:
+            # Save file temporarily, streamed in chunks off the event loop
+            file_size = await asyncio.to_thread(save_upload, file.file, file_path)
+            
+            # Check file size
+            if file_size > MAX_FILE_SIZE:
+                raise HTTPException(
+                    status_code=413, 
+                    detail=f"File too large. Maximum size is {MAX_FILE_SIZE} bytes"
+                )
+            
+            # Validate PDF
+            if not pdf_scanner.is_valid_pdf(file_path):
+                raise HTTPException(status_code=400, detail="Invalid PDF file")
+            
+            # Scan the PDF in the process pool for CPU-intensive work
+            start_time = time.time()
+            scan_result = await run_in_pdf_pool(scan_pdf_in_worker, file_path)
+            processing_time_ms = int((time.time() - start_time) * 1000)
+            
+            # Record Prometheus metrics
+            prometheus_metrics.record_request("scan", "success" if scan_result["status"] == "success" else "error")
+            prometheus_metrics.record_processing_time("scan", (time.time() - start_time))
+            prometheus_metrics.record_file_size(file_size)
+            if scan_result["status"] == "success":
+                prometheus_metrics.record_pages_processed(scan_result.get("total_pages", 0))
+                for finding in scan_result.get("findings", []):
+                    prometheus_metrics.record_findings(finding.get("type", "unknown"))
+            
+            # Store results in database
+            db.store_scan_result(document_id, file.filename, scan_result, processing_time_ms)
+            
+            # Prepare response
+            response = {
+                "document_id": document_id,
+                "filename": file.filename,
+                "status": scan_result["status"],
+                "processing_time_ms": processing_time_ms
+            }
+            
+            if scan_result["status"] == "success":
+                response.update({
+                    "findings": scan_result["findings"],
+                    "findings_count": scan_result["findings_count"],
+                    "total_pages": scan_result["total_pages"],
+                    "file_size": scan_result["file_size"]
+                })
+            elif scan_result["status"] == "error":
+                response["error"] = scan_result["error"]
+            
+            return response
         
     except HTTPException:
-        # Clean up file if it exists
-        file_path = os.path.join(UPLOAD_DIR, f"{document_id}.pdf")
-        if os.path.exists(file_path):
-            os.remove(file_path)
         raise
     except Exception as e:
-        # Clean up file if it exists
-        file_path = os.path.join(UPLOAD_DIR, f"{document_id}.pdf")
-        if os.path.exists(file_path):
-            os.remove(file_path)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/findings")
@@ -221,120 +309,97 @@ async def upload_and_redact_file(file: UploadFile = File(...)):
     operation_id = None
     
     try:
-        # Read file content
-        content = await file.read()
-        file_size = len(content)
-        
-        # Start metrics tracking
-        operation_id = metrics_collector.start_operation(document_id, "scan_and_redact", file_size)
-        
-        # Check file size
-        if file_size > MAX_FILE_SIZE:
-            metrics_collector.record_error("file_too_large", "upload_and_redact")
-            raise HTTPException(
-                status_code=413, 
-                detail=f"File too large. Maximum size is {MAX_FILE_SIZE} bytes"
-            )
-        
-        # Save file temporarily
-        file_path = os.path.join(UPLOAD_DIR, f"{document_id}.pdf")
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        # Validate PDF
-        if not pdf_scanner.is_valid_pdf(file_path):
-            os.remove(file_path)
-            metrics_collector.record_error("invalid_pdf", "upload_and_redact")
-            raise HTTPException(status_code=400, detail="Invalid PDF file")
-        
-        # Scan and redact the PDF using thread pool for CPU-intensive work
-        start_time = time.time()
-        loop = asyncio.get_event_loop()
-        scan_redact_result = await loop.run_in_executor(
-            PDF_PROCESSING_POOL, 
-            pdf_scanner.scan_and_redact_pdf, 
-            file_path
-        )
-        processing_time_ms = int((time.time() - start_time) * 1000)
-        
-        # Record Prometheus metrics
-        prometheus_metrics.record_request("scan_and_redact", "success" if scan_redact_result["status"] == "success" else "error")
-        prometheus_metrics.record_processing_time("scan_and_redact", (time.time() - start_time))
-        prometheus_metrics.record_file_size(file_size)
-        if scan_redact_result["status"] == "success":
-            prometheus_metrics.record_pages_processed(scan_redact_result.get("total_pages", 0))
-            for finding in scan_redact_result.get("findings", []):
-                prometheus_metrics.record_findings(finding.get("type", "unknown"))
-        
-        # Store scan results in database
-        try:
-            db.store_scan_result(document_id, file.filename, scan_redact_result, processing_time_ms)
-        except Exception as db_error:
-            metrics_collector.record_error("database_error", "upload_and_redact")
-            print(f"Database error: {db_error}")
-        
-        # Determine success and collect metrics
-        success = scan_redact_result["status"] == "success"
-        findings_count = scan_redact_result.get("findings_count", 0)
-        pages_processed = scan_redact_result.get("total_pages", 0)
-        redacted_instances = 0
-        
-        if success and "redaction" in scan_redact_result:
-            redacted_instances = scan_redact_result["redaction"].get("redacted_count", 0)
-        
-        error_type = None if success else "processing_error"
-        
-        # End metrics tracking
-        if operation_id:
-            metrics_collector.end_operation(
-                operation_id, 
-                success=success,
-                findings_count=findings_count,
-                pages_processed=pages_processed,
-                redacted_instances=redacted_instances,
-                error_type=error_type
-            )
-        
-        # Prepare response
-        response = {
-            "document_id": document_id,
-            "filename": file.filename,
-            "status": scan_redact_result["status"],
-            "processing_time_ms": processing_time_ms
-        }
-        
-        if scan_redact_result["status"] == "success":
-            response.update({
-                "findings": scan_redact_result["findings"],
-                "findings_count": scan_redact_result["findings_count"],
-                "total_pages": scan_redact_result["total_pages"],
-                "file_size": scan_redact_result["file_size"],
-                "redaction": scan_redact_result["redaction"]
-            })
-        elif scan_redact_result["status"] == "error":
-            response["error"] = scan_redact_result["error"]
-        
-        # Clean up original file but keep redacted version temporarily
-        os.remove(file_path)
-        
-        return response
+        # The original is removed however the request ends; the redacted version is kept temporarily
+        async with temp_upload(document_id) as file_path:
+            # Save file temporarily, streamed in chunks off the event loop
+            file_size = await asyncio.to_thread(save_upload, file.file, file_path)
+            
+            # Start metrics tracking
+            operation_id = metrics_collector.start_operation(document_id, "scan_and_redact", file_size)
+            
+            # Check file size
+            if file_size > MAX_FILE_SIZE:
+                metrics_collector.record_error("file_too_large", "upload_and_redact")
+                raise HTTPException(
+                    status_code=413, 
+                    detail=f"File too large. Maximum size is {MAX_FILE_SIZE} bytes"
+                )
+            
+            # Validate PDF
+            if not pdf_scanner.is_valid_pdf(file_path):
+                metrics_collector.record_error("invalid_pdf", "upload_and_redact")
+                raise HTTPException(status_code=400, detail="Invalid PDF file")
+            
+            # Scan and redact the PDF in the process pool for CPU-intensive work
+            start_time = time.time()
+            scan_redact_result = await run_in_pdf_pool(scan_and_redact_pdf_in_worker, file_path)
+            processing_time_ms = int((time.time() - start_time) * 1000)
+            
+            # Record Prometheus metrics
+            prometheus_metrics.record_request("scan_and_redact", "success" if scan_redact_result["status"] == "success" else "error")
+            prometheus_metrics.record_processing_time("scan_and_redact", (time.time() - start_time))
+            prometheus_metrics.record_file_size(file_size)
+            if scan_redact_result["status"] == "success":
+                prometheus_metrics.record_pages_processed(scan_redact_result.get("total_pages", 0))
+                for finding in scan_redact_result.get("findings", []):
+                    prometheus_metrics.record_findings(finding.get("type", "unknown"))
+            
+            # Store scan results in database
+            if not db.store_scan_result(document_id, file.filename, scan_redact_result, processing_time_ms):
+                metrics_collector.record_error("database_error", "upload_and_redact")
+            
+            # Determine success and collect metrics
+            success = scan_redact_result["status"] == "success"
+            findings_count = scan_redact_result.get("findings_count", 0)
+            pages_processed = scan_redact_result.get("total_pages", 0)
+            redacted_instances = 0
+            
+            if success and "redaction" in scan_redact_result:
+                redacted_instances = scan_redact_result["redaction"].get("redacted_count", 0)
+            
+            error_type = None if success else "processing_error"
+            
+            # End metrics tracking
+            if operation_id:
+                metrics_collector.end_operation(
+                    operation_id, 
+                    success=success,
+                    findings_count=findings_count,
+                    pages_processed=pages_processed,
+                    redacted_instances=redacted_instances,
+                    error_type=error_type
+                )
+            
+            # Prepare response
+            response = {
+                "document_id": document_id,
+                "filename": file.filename,
+                "status": scan_redact_result["status"],
+                "processing_time_ms": processing_time_ms
+            }
+            
+            if scan_redact_result["status"] == "success":
+                response.update({
+                    "findings": scan_redact_result["findings"],
+                    "findings_count": scan_redact_result["findings_count"],
+                    "total_pages": scan_redact_result["total_pages"],
+                    "file_size": scan_redact_result["file_size"],
+                    "redaction": scan_redact_result["redaction"]
+                })
+                remember_redacted_filename(document_id, file.filename)
+            elif scan_redact_result["status"] == "error":
+                response["error"] = scan_redact_result["error"]
+            
+            return response
         
-    except HTTPException as he:
+    except HTTPException:
         if operation_id:
             metrics_collector.end_operation(operation_id, success=False, error_type="http_error")
-        # Clean up files if they exist
-        file_path = os.path.join(UPLOAD_DIR, f"{document_id}.pdf")
-        if os.path.exists(file_path):
-            os.remove(file_path)
         raise
     except Exception as e:
         if operation_id:
             metrics_collector.end_operation(operation_id, success=False, error_type="unknown_error")
         metrics_collector.record_error("unknown_error", "upload_and_redact")
-        # Clean up files if they exist
-        file_path = os.path.join(UPLOAD_DIR, f"{document_id}.pdf")
-        if os.path.exists(file_path):
-            os.remove(file_path)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/redact/{document_id}")
@@ -358,7 +423,6 @@ async def redact_existing_document(document_id: str):
             )
         
         # Convert findings to Finding objects
-        from pdf_scanner import Finding
         findings = []
         for finding_dict in document['findings']:
             findings.append(Finding(
@@ -371,6 +435,8 @@ async def redact_existing_document(document_id: str):
         # Create redacted version
         redacted_path = os.path.join(UPLOAD_DIR, f"{document_id}_redacted.pdf")
         redaction_result = pdf_scanner.create_redacted_pdf(original_path, findings, redacted_path)
+        if redaction_result.get("status") == "success":
+            remember_redacted_filename(document_id, document['filename'])
         
         return redaction_result
         
@@ -385,22 +451,31 @@ async def download_redacted_file(document_id: str):
     try:
         redacted_path = os.path.join(UPLOAD_DIR, f"{document_id}_redacted.pdf")
         
-        if not os.path.exists(redacted_path):
+        # One stat serves as the existence check and is handed to the response
+        try:
+            redacted_stat = os.stat(redacted_path)
+        except FileNotFoundError:
             raise HTTPException(status_code=404, detail="Redacted file not found")
         
-        # Get original filename from database
-        findings_data = db.get_findings(document_id=document_id)
-        if not findings_data:
+        # Get original filename, from the database only if this worker did not redact it
+        original_filename = redacted_filenames.get(document_id)
+        if original_filename is None:
+            findings_data = db.get_findings(document_id=document_id)
+            if findings_data:
+                original_filename = findings_data[0]['filename']
+                remember_redacted_filename(document_id, original_filename)
+        
+        if original_filename is None:
             filename = f"{document_id}_redacted.pdf"
         else:
-            original_filename = findings_data[0]['filename']
             base_name = os.path.splitext(original_filename)[0]
             filename = f"{base_name}_redacted.pdf"
         
         return FileResponse(
             path=redacted_path,
             filename=filename,
-            media_type='application/pdf'
+            media_type='application/pdf',
+            stat_result=redacted_stat
         )
         
     except HTTPException:
@@ -422,12 +497,10 @@ async def get_throughput_metrics(minutes: int = 60):
     try:
         # Try to get Prometheus metrics for more accurate data
         try:
-            from prometheus_client.parser import text_string_to_metric_families
+            # Get Prometheus samples directly (avoid self-referencing HTTP call)
+            samples = prometheus_metrics.get_samples()
             
-            # Get Prometheus metrics directly (avoid self-referencing HTTP call)
-            metrics_text = prometheus_metrics.get_metrics()
-            
-            if metrics_text:
+            if samples:
                 # Parse Prometheus metrics
                 total_requests = 0
                 total_processing_time = 0
@@ -437,29 +510,27 @@ async def get_throughput_metrics(minutes: int = 60):
                 file_size_sum = 0
                 file_size_count = 0
                 
-                for family in text_string_to_metric_families(metrics_text):
-                    if family.name == 'pdf_requests':
-                        for sample in family.samples:
-                            if sample.labels.get('status') == 'success':
-                                total_requests += sample.value
-                    elif family.name == 'pdf_processing_duration_seconds':
-                        for sample in family.samples:
-                            if sample.name.endswith('_sum'):
-                                total_processing_time += sample.value
-                            elif sample.name.endswith('_count'):
-                                total_processing_count += sample.value
-                    elif family.name == 'pdf_findings':
-                        for sample in family.samples:
-                            if sample.labels.get('finding_type') == 'email':
-                                email_findings += sample.value
-                            elif sample.labels.get('finding_type') == 'ssn':
-                                ssn_findings += sample.value
-                    elif family.name == 'pdf_file_size_bytes':
-                        for sample in family.samples:
-                            if sample.name.endswith('_sum'):
-                                file_size_sum += sample.value
-                            elif sample.name.endswith('_count'):
-                                file_size_count += sample.value
+                for sample in samples.get('pdf_requests', []):
+                    if sample.labels.get('status') == 'success':
+                        total_requests += sample.value
+                
+                for sample in samples.get('pdf_processing_duration_seconds', []):
+                    if sample.name.endswith('_sum'):
+                        total_processing_time += sample.value
+                    elif sample.name.endswith('_count'):
+                        total_processing_count += sample.value
+                
+                for sample in samples.get('pdf_findings', []):
+                    if sample.labels.get('finding_type') == 'email':
+                        email_findings += sample.value
+                    elif sample.labels.get('finding_type') == 'ssn':
+                        ssn_findings += sample.value
+                
+                for sample in samples.get('pdf_file_size_bytes', []):
+                    if sample.name.endswith('_sum'):
+                        file_size_sum += sample.value
+                    elif sample.name.endswith('_count'):
+                        file_size_count += sample.value
                 
                 # Calculate derived metrics
                 avg_processing_time_ms = (total_processing_time / total_processing_count * 1000) if total_processing_count > 0 else 0
@@ -498,12 +569,10 @@ async def get_system_metrics(minutes: int = 60):
     try:
         # Try to get Prometheus system metrics for more accurate data
         try:
-            from prometheus_client.parser import text_string_to_metric_families
-            
-            # Get Prometheus metrics directly (avoid self-referencing HTTP call)
-            metrics_text = prometheus_metrics.get_metrics()
+            # Get Prometheus samples directly (avoid self-referencing HTTP call)
+            samples = prometheus_metrics.get_samples()
             
-            if metrics_text:
+            if samples:
                 
                 # Parse Prometheus system metrics
                 cpu_percent = 0
@@ -511,19 +580,17 @@ async def get_system_metrics(minutes: int = 60):
                 memory_used_bytes = 0
                 active_threads = 0
                 
-                for family in text_string_to_metric_families(metrics_text):
-                    if family.name == 'system_cpu_usage_percent':
-                        for sample in family.samples:
-                            cpu_percent = sample.value
-                    elif family.name == 'system_memory_usage_percent':
-                        for sample in family.samples:
-                            memory_percent = sample.value
-                    elif family.name == 'process_memory_used_bytes':
-                        for sample in family.samples:
-                            memory_used_bytes = sample.value
-                    elif family.name == 'pdf_processor_active_threads':
-                        for sample in family.samples:
-                            active_threads = sample.value
+                for sample in samples.get('system_cpu_usage_percent', []):
+                    cpu_percent = sample.value
+                
+                for sample in samples.get('system_memory_usage_percent', []):
+                    memory_percent = sample.value
+                
+                for sample in samples.get('process_memory_used_bytes', []):
+                    memory_used_bytes = sample.value
+                
+                for sample in samples.get('pdf_processor_active_threads', []):
+                    active_threads = sample.value
                 
                 return {
                     "latest": {
@@ -573,23 +640,19 @@ async def get_error_metrics():
     try:
         # Try to get Prometheus error metrics
         try:
-            from prometheus_client.parser import text_string_to_metric_families
-            
-            # Get Prometheus metrics directly (avoid self-referencing HTTP call)
-            metrics_text = prometheus_metrics.get_metrics()
+            # Get Prometheus samples directly (avoid self-referencing HTTP call)
+            samples = prometheus_metrics.get_samples()
             
-            if metrics_text:
+            if samples:
                 
                 # Parse error metrics from Prometheus
                 errors = {}
                 
-                for family in text_string_to_metric_families(metrics_text):
-                    if family.name == 'pdf_errors':
-                        for sample in family.samples:
-                            error_type = sample.labels.get('error_type', 'unknown')
-                            operation = sample.labels.get('operation', 'unknown')
-                            error_key = f"{error_type}_{operation}"
-                            errors[error_key] = int(sample.value)
+                for sample in samples.get('pdf_errors', []):
+                    error_type = sample.labels.get('error_type', 'unknown')
+                    operation = sample.labels.get('operation', 'unknown')
+                    error_key = f"{error_type}_{operation}"
+                    errors[error_key] = int(sample.value)
                 
                 return {
                     "errors": errors,
@@ -614,12 +677,10 @@ async def get_performance_insights(minutes: int = 60):
     try:
         # Try to get Prometheus metrics for insights
         try:
-            from prometheus_client.parser import text_string_to_metric_families
+            # Get Prometheus samples directly (avoid self-referencing HTTP call)
+            samples = prometheus_metrics.get_samples()
             
-            # Get Prometheus metrics directly (avoid self-referencing HTTP call)
-            metrics_text = prometheus_metrics.get_metrics()
-            
-            if metrics_text:
+            if samples:
                 
                 # Parse key metrics for insights
                 total_requests = 0
@@ -629,26 +690,24 @@ async def get_performance_insights(minutes: int = 60):
                 uptime_seconds = 0
                 active_threads = 0
                 
-                for family in text_string_to_metric_families(metrics_text):
-                    if family.name == 'pdf_requests':
-                        for sample in family.samples:
-                            if sample.labels.get('status') == 'success':
-                                total_requests += sample.value
-                    elif family.name == 'pdf_errors':
-                        for sample in family.samples:
-                            total_errors += sample.value
-                    elif family.name == 'system_cpu_usage_percent':
-                        for sample in family.samples:
-                            cpu_percent = sample.value
-                    elif family.name == 'system_memory_usage_percent':
-                        for sample in family.samples:
-                            memory_percent = sample.value
-                    elif family.name == 'pdf_scanner_uptime_seconds':
-                        for sample in family.samples:
-                            uptime_seconds = sample.value
-                    elif family.name == 'pdf_processor_active_threads':
-                        for sample in family.samples:
-                            active_threads = sample.value
+                for sample in samples.get('pdf_requests', []):
+                    if sample.labels.get('status') == 'success':
+                        total_requests += sample.value
+                
+                for sample in samples.get('pdf_errors', []):
+                    total_errors += sample.value
+                
+                for sample in samples.get('system_cpu_usage_percent', []):
+                    cpu_percent = sample.value
+                
+                for sample in samples.get('system_memory_usage_percent', []):
+                    memory_percent = sample.value
+                
+                for sample in samples.get('pdf_scanner_uptime_seconds', []):
+                    uptime_seconds = sample.value
+                
+                for sample in samples.get('pdf_processor_active_threads', []):
+                    active_threads = sample.value
                 
                 # Generate insights based on Prometheus data
                 bottlenecks = []
@@ -704,6 +763,21 @@ async def get_performance_insights(minutes: int = 60):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics/dashboard")
+async def get_dashboard_metrics(minutes: int = 60):
+    """Get all dashboard metrics in a single round-trip."""
+    try:
+        return {
+            "throughput": await get_throughput_metrics(minutes),
+            "system": await get_system_metrics(minutes),
+            "insights": await get_performance_insights(minutes),
+            "errors": await get_error_metrics()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/health/detailed")
 async def detailed_health_check():
     """Detailed health check with metrics."""
@@ -712,19 +786,19 @@ async def detailed_health_check():
         insights = metrics_collector.get_performance_insights(5)  # Last 5 minutes
         throughput = metrics_collector.get_throughput_metrics(5)
         
-        # Using thread pool with multi-worker deployment for parallelism
-        thread_pool_healthy = PDF_PROCESSING_POOL._threads is not None
+        # Using process pool with multi-worker deployment for parallelism; a worker
+        # dying abruptly marks the whole pool broken
+        process_pool_healthy = not PDF_PROCESSING_POOL._broken
         
-        # Using thread pool workers per FastAPI worker
-        active_threads = len([t for t in PDF_PROCESSING_POOL._threads if t.is_alive()]) if PDF_PROCESSING_POOL._threads else 0
+        active_processes = count_pool_workers()
         
         return {
             "status": insights.get("health_status", "unknown"),
             "database": "connected" if db_healthy else "disconnected",
-            "thread_pool": "active" if thread_pool_healthy else "inactive",
-            "thread_pool_workers": PDF_PROCESSING_POOL._max_workers,
-            "active_threads": active_threads,
-            "async_processing": "multi_worker_optimized" if thread_pool_healthy else "unavailable",
+            "process_pool": "active" if process_pool_healthy else "broken",
+            "process_pool_workers": PDF_PROCESSING_POOL._max_workers,
+            "active_processes": active_processes,
+            "async_processing": "multi_worker_optimized" if process_pool_healthy else "unavailable",
             "performance_score": insights.get("performance_score", 0),
             "uptime_seconds": insights.get("uptime_seconds", 0),
             "recent_throughput": {
@@ -739,7 +813,7 @@ async def detailed_health_check():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# Async processing endpoints removed for now - focusing on sync optimizations with thread pools
+# Async processing endpoints removed for now - focusing on sync optimizations with process pools
 
 @app.get("/scaling-recommendations")
 async def get_scaling_recommendations(minutes: int = 10):
@@ -753,10 +827,8 @@ async def get_scaling_recommendations(minutes: int = 10):
 async def get_prometheus_metrics():
     """Prometheus metrics endpoint for scraping."""
     try:
-        # Update active thread count
-        if PDF_PROCESSING_POOL._threads:
-            active_threads = len([t for t in PDF_PROCESSING_POOL._threads if t.is_alive()])
-            prometheus_metrics.update_active_threads(active_threads)
+        # Update active worker count (the gauge keeps its thread-era name for the recording rules)
+        prometheus_metrics.update_active_threads(count_pool_workers())
         
         metrics_output = prometheus_metrics.get_metrics()
         return Response(
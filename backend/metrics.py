@@ -5,6 +5,7 @@ Provides performance monitoring, throughput tracking, and operational insights.
 
 import time
 import psutil
+import queue
 import threading
 from collections import deque, defaultdict
 from typing import Dict, List, Any, Optional
@@ -14,7 +15,8 @@ import statistics
 import os
 
 
-@dataclass
+# Slotted: thousands of samples are retained in the collector's deques
+@dataclass(slots=True)
 class ProcessingMetrics:
     """Individual processing operation metrics."""
     timestamp: float
@@ -28,7 +30,7 @@ class ProcessingMetrics:
     redacted_instances: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class SystemMetrics:
     """System resource metrics."""
     timestamp: float
@@ -66,6 +68,13 @@ class MetricsCollector:
         self.active_operations = {}
         self.start_time = time.time()
         
+        # Predictive scaling: forecast resource usage over a replica's cold start
+        self.scale_up_horizon_seconds = int(os.getenv('SCALE_UP_HORIZON_SECONDS', 300))
+        self.ewma_span = 10  # Samples; alpha = 2 / (span + 1)
+        # A trend is only extrapolated from at least ewma_span samples spanning this
+        # fraction of the horizon; fewer noisy samples fall back to the EWMA alone
+        self.min_trend_span_fraction = 0.5
+        
         # Thread-safe locks
         self.processing_lock = threading.Lock()
         self.system_lock = threading.Lock()
@@ -79,9 +88,54 @@ class MetricsCollector:
             # Fallback for systems without io_counters access
             self.last_disk_io = type('obj', (object,), {'read_bytes': 0, 'write_bytes': 0})()
         
+        # Operation events are applied by a background thread so callers never
+        # wait on the collector's locks. The thread is started on first use in each
+        # process: Celery imports this module before forking its prefork children,
+        # and a forked child inherits the queue but not the thread draining it
+        self._events = queue.SimpleQueue()
+        self._drainer_pid = None
+        self._drainer_lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+        
         # Start background system monitoring
         self._start_system_monitoring()
     
+    def _reset_after_fork(self):
+        """Give a forked child fresh locks and an empty queue; the parent's drainer is gone."""
+        self._events = queue.SimpleQueue()
+        self._drainer_pid = None
+        self._drainer_lock = threading.Lock()
+        # The drainer may have held these at the moment of the fork
+        self.processing_lock = threading.Lock()
+        self.error_lock = threading.Lock()
+    
+    def _put_event(self, handler, args: tuple):
+        """Queue an operation event, starting this process's drainer thread if needed."""
+        if self._drainer_pid != os.getpid():
+            self._start_event_drainer()
+        self._events.put((handler, args))
+    
+    def _start_event_drainer(self):
+        """Start background thread applying queued operation events."""
+        with self._drainer_lock:
+            if self._drainer_pid == os.getpid():
+                return
+            
+            events = self._events
+            
+            def drain_events():
+                while True:
+                    handler, args = events.get()
+                    try:
+                        handler(*args)
+                    except Exception as e:
+                        print(f"Error applying metrics event: {e}")
+            
+            thread = threading.Thread(target=drain_events, daemon=True)
+            thread.start()
+            self._drainer_pid = os.getpid()
+    
     def _start_system_monitoring(self):
         """Start background thread for system metrics collection."""
         def collect_system_metrics():
@@ -141,28 +195,44 @@ class MetricsCollector:
     
     def start_operation(self, operation_id: str, operation_type: str, file_size: int) -> str:
         """Start tracking an operation."""
+        self._put_event(self._apply_start_operation, (operation_id, operation_type, file_size, time.time()))
+        return operation_id
+    
+    def end_operation(self, operation_id: str, success: bool, findings_count: int = 0, 
+                     pages_processed: int = 0, redacted_instances: int = 0, 
+                     error_type: Optional[str] = None):
+        """End tracking an operation and record metrics."""
+        self._put_event(self._apply_end_operation, (
+            operation_id, time.time(), success, findings_count,
+            pages_processed, redacted_instances, error_type
+        ))
+    
+    def record_error(self, error_type: str, operation_type: str = "unknown"):
+        """Record an error occurrence."""
+        self._put_event(self._apply_error, (error_type, operation_type))
+    
+    def _apply_start_operation(self, operation_id: str, operation_type: str, file_size: int, start_time: float):
+        """Begin tracking an operation, on the drainer thread."""
         operation_data = {
             'operation_type': operation_type,
             'file_size': file_size,
-            'start_time': time.time(),
+            'start_time': start_time,
             'pages_processed': 0
         }
         
         self.active_operations[operation_id] = operation_data
-        return operation_id
     
-    def end_operation(self, operation_id: str, success: bool, findings_count: int = 0, 
-                     pages_processed: int = 0, redacted_instances: int = 0, 
-                     error_type: Optional[str] = None):
-        """End tracking an operation and record metrics."""
+    def _apply_end_operation(self, operation_id: str, end_time: float, success: bool, findings_count: int,
+                             pages_processed: int, redacted_instances: int, error_type: Optional[str]):
+        """Record a finished operation, on the drainer thread."""
         if operation_id not in self.active_operations:
             return
         
         operation_data = self.active_operations.pop(operation_id)
-        processing_time_ms = (time.time() - operation_data['start_time']) * 1000
+        processing_time_ms = (end_time - operation_data['start_time']) * 1000
         
         metrics = ProcessingMetrics(
-            timestamp=time.time(),
+            timestamp=end_time,
             operation_type=operation_data['operation_type'],
             file_size_bytes=operation_data['file_size'],
             processing_time_ms=processing_time_ms,
@@ -181,8 +251,8 @@ class MetricsCollector:
             with self.error_lock:
                 self.error_counts[error_type] += 1
     
-    def record_error(self, error_type: str, operation_type: str = "unknown"):
-        """Record an error occurrence."""
+    def _apply_error(self, error_type: str, operation_type: str):
+        """Count an error occurrence, on the drainer thread."""
         with self.error_lock:
             self.error_counts[f"{operation_type}:{error_type}"] += 1
     
@@ -246,11 +316,12 @@ class MetricsCollector:
         processing_times = [m.processing_time_ms for m in recent_metrics]
         avg_processing_time = statistics.mean(processing_times)
         
-        # Percentiles
-        sorted_times = sorted(processing_times)
-        p50 = self._percentile(sorted_times, 50)
-        p95 = self._percentile(sorted_times, 95)
-        p99 = self._percentile(sorted_times, 99)
+        # Percentiles: one sort for all cut points, linearly interpolated
+        if len(processing_times) > 1:
+            percentiles = statistics.quantiles(processing_times, n=100, method='inclusive')
+            p50, p95, p99 = percentiles[49], percentiles[94], percentiles[98]
+        else:
+            p50 = p95 = p99 = processing_times[0]
         
         # Success rates
         success_rate = (successful_operations / total_operations * 100) if total_operations > 0 else 0
@@ -309,20 +380,6 @@ class MetricsCollector:
             'health_status': self._get_health_status()
         }
     
-    def _percentile(self, data: List[float], percentile: float) -> float:
-        """Calculate percentile from sorted data."""
-        if not data:
-            return 0
-        
-        k = (len(data) - 1) * (percentile / 100)
-        f = int(k)
-        c = k - f
-        
-        if f == len(data) - 1:
-            return data[f]
-        
-        return data[f] + c * (data[f + 1] - data[f])
-    
     def _cleanup_old_processing_metrics(self):
         """Remove old processing metrics beyond retention period."""
         cutoff_time = time.time() - (self.retention_minutes * 60)
@@ -442,13 +499,37 @@ class MetricsCollector:
         avg_cpu = statistics.mean([m.cpu_percent for m in system_metrics])
         avg_memory = statistics.mean([m.memory_percent for m in system_metrics])
         
+        # Forecast usage one cold start ahead so new replicas are ready in time
+        forecast_cpu = self._forecast(system_metrics, 'cpu_percent')
+        forecast_memory = self._forecast(system_metrics, 'memory_percent')
+        
         # Scale up triggers
-        resource_pressure = avg_cpu > 80 or avg_memory > 80
+        resource_pressure = max(avg_cpu, forecast_cpu) > 80 or max(avg_memory, forecast_memory) > 80
         high_load = throughput and throughput.requests_per_minute > 40
         degraded_performance = throughput and throughput.p95_processing_time_ms > 5000
         
         return resource_pressure or (high_load and degraded_performance)
     
+    def _forecast(self, system_metrics: List[SystemMetrics], attribute: str) -> float:
+        """
+        Forecast a system metric scale_up_horizon_seconds ahead from its EWMA and linear trend.
+        The result is a percentage, clamped to [0, 100].
+        """
+        values = [getattr(m, attribute) for m in system_metrics]
+        
+        alpha = 2 / (self.ewma_span + 1)
+        ewma = values[0]
+        for value in values[1:]:
+            ewma = alpha * value + (1 - alpha) * ewma
+        
+        timestamps = [m.timestamp for m in system_metrics]
+        min_span_seconds = self.scale_up_horizon_seconds * self.min_trend_span_fraction
+        if len(values) < max(2, self.ewma_span) or timestamps[-1] - timestamps[0] < max(min_span_seconds, 1):
+            return min(max(ewma, 0.0), 100.0)
+        
+        slope = statistics.linear_regression(timestamps, values).slope  # Units per second
+        return min(max(ewma + slope * self.scale_up_horizon_seconds, 0.0), 100.0)
+    
     def should_scale_down(self, system_metrics: List[SystemMetrics] = None,
                          throughput: ThroughputMetrics = None) -> bool:
         """Determine if the system can scale down to save resources."""
@@ -498,6 +579,11 @@ class MetricsCollector:
                 'cpu_pressure': statistics.mean([m.cpu_percent for m in system_metrics]) > 75 if system_metrics else False,
                 'memory_pressure': statistics.mean([m.memory_percent for m in system_metrics]) > 75 if system_metrics else False
             },
+            'forecast': {
+                'horizon_seconds': self.scale_up_horizon_seconds,
+                'cpu_percent': round(self._forecast(system_metrics, 'cpu_percent'), 1) if system_metrics else None,
+                'memory_percent': round(self._forecast(system_metrics, 'memory_percent'), 1) if system_metrics else None
+            },
             'load_characteristics': {
                 'current_rpm': throughput.requests_per_minute,
                 'load_level': self._classify_load_level(throughput.requests_per_minute),
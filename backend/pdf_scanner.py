@@ -1,24 +1,48 @@
 import re
+import bisect
 import PyPDF2
 import pdfplumber
-import fitz  # PyMuPDF for redaction
-from typing import List, Dict, Any, Optional
+import fitz  # PyMuPDF for text extraction and redaction
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 import os
 import tempfile
 import gc
-import weakref
 import time
 from contextlib import contextmanager
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+import multiprocessing
 import threading
 
-@dataclass
+try:
+    # RE2 matches in linear time (DFA); fall back to the stdlib backtracking engine
+    import re2 as regex_engine
+except ImportError:
+    regex_engine = re
+
+@dataclass(slots=True)
 class Finding:
     type: str
     value: str
     page: int
-    position: Dict[str, Any] = None
+    position: Optional[Dict[str, Any]] = None
+
+# Translation table stripping SSN separators before range validation
+SSN_SEPARATORS = str.maketrans('', '', '- ')
+
+def is_plausible_ssn(value: str) -> bool:
+    """Check SSN ranges: area not 000, 666 or 9XX; group not 00; serial not 0000."""
+    digits = value.translate(SSN_SEPARATORS)
+    area, group, serial = digits[:3], digits[3:5], digits[5:]
+    return area not in ('000', '666') and area[0] != '9' and group != '00' and serial != '0000'
+
+def remove_file_if_present(file_path: str) -> bool:
+    """Remove a file, returning False if it was already gone."""
+    try:
+        os.unlink(file_path)  # A missing file raises instead of needing an exists() check
+        return True
+    except FileNotFoundError:
+        return False
 
 class PDFTimeoutError(Exception):
     """Raised when PDF processing takes too long."""
@@ -40,19 +64,16 @@ def with_timeout(timeout_seconds: int = 60):
     return decorator
 
 class PDFScanner:
-    def __init__(self):
-        # Email regex pattern
-        self.email_pattern = re.compile(
-            r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
+    def __init__(self, use_page_pool: Optional[bool] = None):
+        # Email and SSN patterns combined into a single alternation so each page
+        # is scanned in one pass; match.lastgroup tells which pattern matched
+        self.sensitive_data_pattern = regex_engine.compile(
+            r'(?P<email>\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b)'
+            r'|(?P<ssn_dash>\b\d{3}-\d{2}-\d{4}\b)'  # XXX-XX-XXXX
+            r'|(?P<ssn_space>\b\d{3} \d{2} \d{4}\b)'  # XXX XX XXXX
+            r'|(?P<ssn_plain>\b\d{9}\b)'  # XXXXXXXXX (9 consecutive digits)
         )
         
-        # SSN regex patterns (various formats)
-        self.ssn_patterns = [
-            re.compile(r'\b\d{3}-\d{2}-\d{4}\b'),  # XXX-XX-XXXX
-            re.compile(r'\b\d{3}\s\d{2}\s\d{4}\b'),  # XXX XX XXXX
-            re.compile(r'\b\d{9}\b'),  # XXXXXXXXX (9 consecutive digits)
-        ]
-        
         # Memory management handled through context managers and finally blocks
         
         # Processing limits for oversized PDFs
@@ -60,6 +81,19 @@ class PDFScanner:
         self.MAX_PAGES = int(os.getenv('MAX_PDF_PAGES', 500))  # 500 pages max
         self.MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 10 * 1024 * 1024))  # 10MB per page
         self.PROCESSING_TIMEOUT = int(os.getenv('PDF_PROCESSING_TIMEOUT', 120))  # 2 minutes
+        
+        # Large PDFs are split into page ranges and scanned in the page pool. Opt-in
+        # (PDF_PAGE_POOL=1): processes that are already one of many scan workers
+        # (Celery prefork children, main.py's document pool) must not each start one
+        if use_page_pool is None:
+            use_page_pool = os.getenv('PDF_PAGE_POOL', '0') == '1'
+        self.use_page_pool = use_page_pool
+        self.PARALLEL_PAGE_THRESHOLD = int(os.getenv('PARALLEL_PAGE_THRESHOLD', 20))
+        self.PAGE_CHUNK_SIZE = int(os.getenv('PAGE_CHUNK_SIZE', 10))
+        
+        # Very long page text is scanned in overlapping windows to bound the regex working set
+        self.SCAN_WINDOW_SIZE = int(os.getenv('SCAN_WINDOW_SIZE', 64 * 1024))
+        self.SCAN_WINDOW_OVERLAP = 256  # Longer than any email (254 chars max) or SSN match
     
     @contextmanager
     def _memory_managed_processing(self):
@@ -67,18 +101,18 @@ class PDFScanner:
         try:
             yield
         finally:
-            # Force garbage collection after processing
-            gc.collect()
+            # Collect only the youngest generation; a full collection walks
+            # every live object and costs more than it frees here
+            gc.collect(0)
 
-    @with_timeout(120)  # 2 minute timeout
-    def scan_pdf(self, file_path: str) -> Dict[str, Any]:
+    def _check_processable(self, file_path: str) -> Tuple[int, Optional[Dict[str, Any]]]:
         """
-        Scan a PDF file for sensitive data with memory optimization and timeout protection.
-        Returns a dictionary with scan results.
+        Run the cheap pre-validation checks shared by scan and redact entry points.
+        Returns (file_size, error_result); error_result is None when the file can be processed.
         """
         # Pre-validation checks
         if not os.path.exists(file_path):
-            return {
+            return 0, {
                 'status': 'error',
                 'error': 'File not found',
                 'file_size': 0
@@ -88,7 +122,7 @@ class PDFScanner:
         
         # Check file size before processing
         if file_size > self.MAX_FILE_SIZE:
-            return {
+            return file_size, {
                 'status': 'error',
                 'error': f'File too large: {file_size} bytes exceeds limit of {self.MAX_FILE_SIZE} bytes',
                 'file_size': file_size
@@ -96,43 +130,49 @@ class PDFScanner:
         
         # Validate PDF format
         if not self.is_valid_pdf(file_path):
-            return {
+            return file_size, {
                 'status': 'error',
                 'error': 'Invalid or corrupt PDF file',
                 'file_size': file_size
             }
+        
+        return file_size, None
+
+    @with_timeout(120)  # 2 minute timeout
+    def scan_pdf(self, file_path: str) -> Dict[str, Any]:
+        """
+        Scan a PDF file for sensitive data with memory optimization and timeout protection.
+        Returns a dictionary with scan results.
+        """
+        file_size, error_result = self._check_processable(file_path)
+        if error_result:
+            return error_result
+        
         with self._memory_managed_processing():
             try:
                 findings = []
+                seen = set()  # (type, value) pairs already reported
                 total_pages = 0
                 
-                # Try pdfplumber first (better text extraction)
+                # Try PyMuPDF first (C-level text extraction)
                 try:
-                    with pdfplumber.open(file_path) as pdf:
-                        total_pages = len(pdf.pages)
+                    with fitz.open(file_path) as doc:
+                        total_pages = doc.page_count
                         
-                        # Process pages in batches to manage memory
-                        batch_size = 5  # Process 5 pages at a time
-                        for i in range(0, total_pages, batch_size):
-                            batch_findings = []
-                            end_idx = min(i + batch_size, total_pages)
-                            
-                            for page_num in range(i, end_idx):
-                                page = pdf.pages[page_num]
-                                text = page.extract_text()
+                        if self._use_page_pool(total_pages):
+                            # Scan large documents across the page pool
+                            findings = self._scan_pages_parallel(file_path, total_pages, seen)
+                        else:
+                            for page_num in range(total_pages):
+                                text = self._page_text(doc[page_num])
                                 if text:
-                                    page_findings = self._scan_text(text, page_num + 1)
-                                    batch_findings.extend(page_findings)
-                                # Clear page text from memory
-                                del text
-                            
-                            findings.extend(batch_findings)
-                            # Force garbage collection between batches
-                            if i > 0:
-                                gc.collect()
+                                    findings.extend(self._scan_text(text, page_num + 1, seen))
                                 
-                except Exception as pdfplumber_error:
-                    # Fallback to PyPDF2 with memory management
+                except Exception as fitz_error:
+                    # Fallback to PyPDF2 with memory management. It rescans every page, so
+                    # start over: a partial PyMuPDF pass must not mark values as reported
+                    findings = []
+                    seen = set()
                     try:
                         with open(file_path, 'rb') as file:
                             pdf_reader = PyPDF2.PdfReader(file)
@@ -148,15 +188,12 @@ class PDFScanner:
                                     page = pdf_reader.pages[page_num]
                                     text = page.extract_text()
                                     if text:
-                                        page_findings = self._scan_text(text, page_num + 1)
+                                        page_findings = self._scan_text(text, page_num + 1, seen)
                                         batch_findings.extend(page_findings)
                                     # Clear page text from memory
                                     del text
                                 
                                 findings.extend(batch_findings)
-                                # Force garbage collection between batches
-                                if i > 0:
-                                    gc.collect()
                                     
                     except Exception as pypdf2_error:
                         return {
@@ -165,22 +202,12 @@ class PDFScanner:
                             'file_size': file_size
                         }
                 
-                # Remove duplicates
-                unique_findings = self._deduplicate_findings(findings)
-                
                 return {
                     'status': 'success',
-                    'findings': [
-                        {
-                            'type': f.type,
-                            'value': f.value,
-                            'page': f.page,
-                            'position': f.position
-                        } for f in unique_findings
-                    ],
+                    'findings': findings,
                     'total_pages': total_pages,
                     'file_size': file_size,
-                    'findings_count': len(unique_findings)
+                    'findings_count': len(findings)
                 }
                 
             except PDFTimeoutError as e:
@@ -205,55 +232,129 @@ class PDFScanner:
                     'error_type': 'processing'
                 }
 
-    def _scan_text(self, text: str, page_num: int) -> List[Finding]:
-        """Scan text content for sensitive data patterns."""
+    def _scan_text(self, text: str, page_num: int, seen: Optional[set] = None) -> List[Dict[str, Any]]:
+        """
+        Scan text content for sensitive data patterns.
+        Findings are returned as JSON-ready dicts in the shape of the scan result.
+        When a seen set is given, values already in it are skipped and new ones added,
+        so duplicates are dropped before a Finding is built.
+        """
         findings = []
         
-        # Scan for emails
-        email_matches = self.email_pattern.finditer(text)
-        for match in email_matches:
-            findings.append(Finding(
-                type='email',
-                value=match.group(),
-                page=page_num,
-                position={'start': match.start(), 'end': match.end()}
-            ))
-        
-        # Scan for SSNs
-        for ssn_pattern in self.ssn_patterns:
-            ssn_matches = ssn_pattern.finditer(text)
-            for match in ssn_matches:
-                # Additional validation for 9-digit pattern
-                if len(match.group().replace('-', '').replace(' ', '')) == 9:
-                    findings.append(Finding(
-                        type='ssn',
-                        value=match.group(),
-                        page=page_num,
-                        position={'start': match.start(), 'end': match.end()}
-                    ))
+        for match in self._iter_matches(text):
+            value = match.group()
+            if match.lastgroup == 'email':
+                finding_type = 'email'
+            # Drop digit runs that cannot be issued SSNs
+            elif is_plausible_ssn(value):
+                finding_type = 'ssn'
+            else:
+                continue
+            
+            if seen is not None:
+                key = (finding_type, value)
+                if key in seen:
+                    continue
+                seen.add(key)
+            
+            findings.append({
+                'type': finding_type,
+                'value': value,
+                'page': page_num,
+                'position': {'start': match.start(), 'end': match.end()}
+            })
         
         return findings
 
-    def _deduplicate_findings(self, findings: List[Finding]) -> List[Finding]:
-        """Remove duplicate findings based on type and value."""
-        seen = set()
-        unique_findings = []
+    def _iter_matches(self, text: str):
+        """
+        Yield pattern matches in text, scanning long text in overlapping windows.
+        A window only reports matches that start inside it; the overlap lets a match
+        straddling the boundary complete in the window where it starts. Match offsets
+        stay relative to the full text.
+        """
+        text_length = len(text)
+        if text_length <= self.SCAN_WINDOW_SIZE:
+            yield from self.sensitive_data_pattern.finditer(text)
+            return
         
-        for finding in findings:
-            key = (finding.type, finding.value)
-            if key not in seen:
-                seen.add(key)
-                unique_findings.append(finding)
+        last_end = 0
+        for window_start in range(0, text_length, self.SCAN_WINDOW_SIZE):
+            window_end = window_start + self.SCAN_WINDOW_SIZE
+            search_end = min(window_end + self.SCAN_WINDOW_OVERLAP, text_length)
+            
+            # Resume after the last reported match so a straddling match is not re-found as a suffix
+            for match in self.sensitive_data_pattern.finditer(text, max(window_start, last_end), search_end):
+                if match.start() >= window_end:
+                    break
+                last_end = match.end()
+                yield match
+
+    def _page_text(self, page) -> str:
+        """
+        Extract page text from PyMuPDF words joined by single spaces.
+        Scanning and scan-and-redact both read this text, so a document yields the
+        same findings and positions from either path.
+        """
+        return ' '.join(word[4] for word in page.get_text("words"))
+
+    def _extract_page_words(self, page) -> Tuple[str, List[int], List[tuple]]:
+        """
+        Extract the same text as _page_text, plus each word's start offset and rect
+        so match offsets can be mapped back to page coordinates.
+        """
+        parts = []
+        word_starts = []
+        word_rects = []
+        offset = 0
+        for x0, y0, x1, y1, word, *_ in page.get_text("words"):
+            parts.append(word)
+            word_starts.append(offset)
+            word_rects.append((x0, y0, x1, y1))
+            offset += len(word) + 1
+        return ' '.join(parts), word_starts, word_rects
+
+    def _rects_for_span(self, word_starts: List[int], word_rects: List[tuple],
+                        start: int, end: int) -> List[tuple]:
+        """Get the rects of the words overlapping text[start:end]."""
+        first = max(bisect.bisect_right(word_starts, start) - 1, 0)
+        last = bisect.bisect_left(word_starts, end)
+        return word_rects[first:last]
+
+    def _use_page_pool(self, total_pages: int) -> bool:
+        """Check whether the page pool is enabled and a document is large enough to use it."""
+        return self.use_page_pool and total_pages >= self.PARALLEL_PAGE_THRESHOLD
+
+    def _scan_pages_parallel(self, file_path: str, total_pages: int, seen: set) -> List[Dict[str, Any]]:
+        """
+        Scan page ranges in the page pool and merge unseen findings in page order.
+        Keys go into seen only once every range has returned: a range that raises
+        must not leave values marked as reported when their findings are discarded.
+        """
+        starts = list(range(0, total_pages, self.PAGE_CHUNK_SIZE))
+        ends = [min(start + self.PAGE_CHUNK_SIZE, total_pages) for start in starts]
         
-        return unique_findings
+        findings = []
+        merged = set(seen)
+        for range_findings in get_page_pool().map(_scan_page_range, [file_path] * len(starts), starts, ends):
+            for finding in range_findings:
+                key = (finding['type'], finding['value'])
+                if key not in merged:
+                    merged.add(key)
+                    findings.append(finding)
+        seen.update(merged)
+        return findings
 
     def is_valid_pdf(self, file_path: str) -> bool:
         """Check if file is a valid PDF with comprehensive corruption detection."""
+        # Cheap structural checks on a raw descriptor (no buffered file object)
         try:
-            if not os.path.exists(file_path):
-                return False
-            
-            file_size = os.path.getsize(file_path)
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError:
+            return False
+        
+        try:
+            file_size = os.fstat(fd).st_size
             
             # Check file size limits
             if file_size == 0:
@@ -261,56 +362,46 @@ class PDFScanner:
             if file_size > self.MAX_FILE_SIZE:
                 return False
             
-            with open(file_path, 'rb') as file:
-                # Check PDF header
-                header = file.read(4)
-                if header != b'%PDF':
-                    return False
-                
-                # Try to read version info
-                file.seek(0)
-                first_line = file.readline()
-                if not first_line.startswith(b'%PDF-'):
-                    return False
-                
-                # Look for EOF marker
-                file.seek(-1024, 2)  # Go to last 1KB
-                last_chunk = file.read()
-                if b'%%EOF' not in last_chunk:
-                    return False
-                
-                # Try to parse with PyPDF2 for deeper validation
-                file.seek(0)
-                try:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    page_count = len(pdf_reader.pages)
-                    
-                    # Check page count limits
-                    if page_count > self.MAX_PAGES:
-                        return False
-                    
-                    # Try to access first page (detect structural corruption)
-                    if page_count > 0:
-                        first_page = pdf_reader.pages[0]
-                        # Try to extract something from first page
-                        first_page.extract_text()
-                        
-                except Exception:
-                    # If PyPDF2 fails, try pdfplumber as fallback
-                    try:
-                        with pdfplumber.open(file_path) as pdf:
-                            if len(pdf.pages) > self.MAX_PAGES:
-                                return False
-                            # Try to access first page
-                            if len(pdf.pages) > 0:
-                                pdf.pages[0].extract_text()
-                    except Exception:
-                        return False
-                
-                return True
+            # Check PDF header and version marker
+            if os.read(fd, 5) != b'%PDF-':
+                return False
+            
+            # Look for EOF marker in the last 1KB
+            if b'%%EOF' not in os.pread(fd, 1024, max(0, file_size - 1024)):
+                return False
+        except OSError:
+            return False
+        finally:
+            os.close(fd)
+        
+        # Try to parse with PyPDF2 for deeper validation
+        try:
+            pdf_reader = PyPDF2.PdfReader(file_path)
+            page_count = len(pdf_reader.pages)
+            
+            # Check page count limits
+            if page_count > self.MAX_PAGES:
+                return False
+            
+            # Try to access first page (detect structural corruption)
+            if page_count > 0:
+                first_page = pdf_reader.pages[0]
+                # Try to extract something from first page
+                first_page.extract_text()
                 
         except Exception:
-            return False
+            # If PyPDF2 fails, try pdfplumber as fallback
+            try:
+                with pdfplumber.open(file_path) as pdf:
+                    if len(pdf.pages) > self.MAX_PAGES:
+                        return False
+                    # Try to access first page
+                    if len(pdf.pages) > 0:
+                        pdf.pages[0].extract_text()
+            except Exception:
+                return False
+        
+        return True
 
     def get_file_info(self, file_path: str) -> Dict[str, Any]:
         """Get basic information about the PDF file."""
@@ -358,80 +449,68 @@ class PDFScanner:
             Dictionary with redaction results
         """
         with self._memory_managed_processing():
-            doc = None
             try:
                 if not output_path:
                     # Create output path with _redacted suffix
                     base_name = os.path.splitext(file_path)[0]
                     output_path = f"{base_name}_redacted.pdf"
                 
-                # Open PDF with PyMuPDF
-                doc = fitz.open(file_path)
-                
-                redacted_count = 0
-                
-                # Group findings by page for efficient processing
-                findings_by_page = {}
-                for finding in findings:
-                    page_num = finding.page - 1  # PyMuPDF uses 0-based indexing
-                    if page_num not in findings_by_page:
-                        findings_by_page[page_num] = []
-                    findings_by_page[page_num].append(finding)
-                
-                # Process each page with findings
-                for page_num, page_findings in findings_by_page.items():
-                    if page_num >= len(doc):
-                        continue
-                        
-                    page = doc[page_num]
+                # Open PDF with PyMuPDF; the with block owns closing the document
+                with fitz.open(file_path) as doc:
+                    redacted_count = 0
                     
-                    # Find and redact text instances
-                    for finding in page_findings:
-                        text_instances = page.search_for(finding.value)
+                    # Group findings by page for efficient processing
+                    findings_by_page = {}
+                    for finding in findings:
+                        page_num = finding.page - 1  # PyMuPDF uses 0-based indexing
+                        if page_num not in findings_by_page:
+                            findings_by_page[page_num] = []
+                        findings_by_page[page_num].append(finding)
+                    
+                    # Process each page with findings
+                    for page_num, page_findings in findings_by_page.items():
+                        if page_num >= len(doc):
+                            continue
+                            
+                        page = doc[page_num]
                         
-                        for rect in text_instances:
-                            # Create redaction annotation
-                            redact_annot = page.add_redact_annot(rect)
-                            redact_annot.set_colors(stroke=(0, 0, 0), fill=(0, 0, 0))  # Black redaction
-                            redact_annot.update()
-                            redacted_count += 1
+                        # Find and redact text instances
+                        for finding in page_findings:
+                            text_instances = page.search_for(finding.value)
+                            
+                            for rect in text_instances:
+                                # Create redaction annotation
+                                redact_annot = page.add_redact_annot(rect)
+                                redact_annot.set_colors(stroke=(0, 0, 0), fill=(0, 0, 0))  # Black redaction
+                                redact_annot.update()
+                                redacted_count += 1
+                        
+                        # Apply redactions to the page
+                        page.apply_redactions()
                     
-                    # Apply redactions to the page
-                    page.apply_redactions()
+                    # Save redacted PDF
+                    doc.save(output_path)
+                    
+                    return {
+                        'status': 'success',
+                        'output_path': output_path,
+                        'redacted_count': redacted_count,
+                        'original_file': file_path,
+                        'file_size': os.path.getsize(output_path)
+                    }
                     
-                    # Force garbage collection every 10 pages
-                    if page_num % 10 == 0:
-                        gc.collect()
-                
-                # Save redacted PDF
-                doc.save(output_path)
-                
-                return {
-                    'status': 'success',
-                    'output_path': output_path,
-                    'redacted_count': redacted_count,
-                    'original_file': file_path,
-                    'file_size': os.path.getsize(output_path)
-                }
-                
             except Exception as e:
                 return {
                     'status': 'error',
                     'error': str(e),
                     'original_file': file_path
                 }
-            finally:
-                # Ensure document is properly closed
-                if doc:
-                    try:
-                        doc.close()
-                    except:
-                        pass
 
     @with_timeout(240)  # 4 minute timeout for scan and redact
     def scan_and_redact_pdf(self, file_path: str, output_path: Optional[str] = None) -> Dict[str, Any]:
         """
         Scan a PDF for sensitive data and create a redacted version.
+        The document is parsed once: each page is scanned and redacted in the same pass.
         
         Args:
             file_path: Path to the original PDF
@@ -440,37 +519,177 @@ class PDFScanner:
         Returns:
             Dictionary with scan and redaction results
         """
-        # First, scan for sensitive data
-        scan_result = self.scan_pdf(file_path)
-        
-        if scan_result['status'] != 'success':
-            return scan_result
+        file_size, error_result = self._check_processable(file_path)
+        if error_result:
+            return error_result
         
-        # Convert findings dict back to Finding objects for redaction
-        findings = []
-        for finding_dict in scan_result['findings']:
-            findings.append(Finding(
-                type=finding_dict['type'],
-                value=finding_dict['value'],
-                page=finding_dict['page'],
-                position=finding_dict['position']
-            ))
+        if not output_path:
+            # Create output path with _redacted suffix
+            base_name = os.path.splitext(file_path)[0]
+            output_path = f"{base_name}_redacted.pdf"
         
-        # Create redacted version if findings exist
-        if findings:
-            redaction_result = self.create_redacted_pdf(file_path, findings, output_path)
+        with self._memory_managed_processing():
+            try:
+                doc = fitz.open(file_path)
+            except Exception as e:
+                # MuPDF cannot read the file; scan with the fallback extractors instead
+                scan_result = self.scan_pdf(file_path)
+                if scan_result['status'] != 'success':
+                    return scan_result
+                return {
+                    **scan_result,
+                    'redaction': {
+                        'status': 'error',
+                        'error': str(e),
+                        'original_file': file_path
+                    }
+                }
             
-            # Combine scan and redaction results
-            return {
-                **scan_result,
-                'redaction': redaction_result
-            }
-        else:
-            # No sensitive data found, no redaction needed
-            return {
-                **scan_result,
-                'redaction': {
-                    'status': 'no_redaction_needed',
-                    'message': 'No sensitive data found to redact'
+            with doc:
+                try:
+                    findings = []
+                    seen = set()
+                    redacted_count = 0
+                    total_pages = doc.page_count
+                    
+                    for page_num in range(total_pages):
+                        page = doc[page_num]
+                        text, word_starts, word_rects = self._extract_page_words(page)
+                        if not text:
+                            continue
+                        
+                        # Redact every match on this page, report each value once per document
+                        page_findings = self._scan_text(text, page_num + 1)
+                        for finding in page_findings:
+                            key = (finding['type'], finding['value'])
+                            if key not in seen:
+                                seen.add(key)
+                                findings.append(finding)
+                            
+                            # Match offsets map straight to word rects; no per-value page search
+                            for rect in self._rects_for_span(word_starts, word_rects,
+                                                             finding['position']['start'],
+                                                             finding['position']['end']):
+                                # Create redaction annotation
+                                redact_annot = page.add_redact_annot(rect)
+                                redact_annot.set_colors(stroke=(0, 0, 0), fill=(0, 0, 0))  # Black redaction
+                                redact_annot.update()
+                                redacted_count += 1
+                        
+                        if page_findings:
+                            page.apply_redactions()
+                    
+                    scan_result = {
+                        'status': 'success',
+                        'findings': findings,
+                        'total_pages': total_pages,
+                        'file_size': file_size,
+                        'findings_count': len(findings)
+                    }
+                    
+                except PDFTimeoutError as e:
+                    return {
+                        'status': 'error',
+                        'error': f'PDF processing timeout: {str(e)}',
+                        'file_size': file_size,
+                        'error_type': 'timeout'
+                    }
+                except MemoryError as e:
+                    return {
+                        'status': 'error',
+                        'error': f'PDF too large for available memory: {str(e)}',
+                        'file_size': file_size,
+                        'error_type': 'memory'
+                    }
+                except Exception as e:
+                    return {
+                        'status': 'error',
+                        'error': f'PDF processing failed: {str(e)}',
+                        'file_size': file_size,
+                        'error_type': 'processing'
+                    }
+                
+                if not findings:
+                    # No sensitive data found, no redaction needed
+                    return {
+                        **scan_result,
+                        'redaction': {
+                            'status': 'no_redaction_needed',
+                            'message': 'No sensitive data found to redact'
+                        }
+                    }
+                
+                # Save redacted PDF
+                try:
+                    doc.save(output_path)
+                    redaction_result = {
+                        'status': 'success',
+                        'output_path': output_path,
+                        'redacted_count': redacted_count,
+                        'original_file': file_path,
+                        'file_size': os.path.getsize(output_path)
+                    }
+                except Exception as e:
+                    redaction_result = {
+                        'status': 'error',
+                        'error': str(e),
+                        'original_file': file_path
+                    }
+                
+                # Combine scan and redaction results
+                return {
+                    **scan_result,
+                    'redaction': redaction_result
                 }
-            }
\ No newline at end of file
+
+# Process pool shared by all scanners in this process for page-range scanning.
+# Created lazily with the spawn context so forking a threaded server is avoided.
+_page_pool = None
+_page_pool_lock = threading.Lock()
+
+def get_page_pool() -> ProcessPoolExecutor:
+    """Get the process pool used to scan page ranges of large PDFs."""
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(
+                max_workers=int(os.getenv('PDF_PAGE_WORKERS', os.cpu_count() or 1)),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _page_pool
+
+# Scanner instance owned by a page pool worker process
+_worker_scanner = None
+
+def _scan_page_range(file_path: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """Extract and scan pages [start, end) of a PDF inside a page pool worker."""
+    global _worker_scanner
+    if _worker_scanner is None:
+        _worker_scanner = PDFScanner(use_page_pool=False)
+    
+    findings = []
+    seen = set()
+    with fitz.open(file_path) as doc:
+        for page_num in range(start, end):
+            text = _worker_scanner._page_text(doc[page_num])
+            if text:
+                findings.extend(_worker_scanner._scan_text(text, page_num + 1, seen))
+    return findings
+
+# Scanner instance owned by a document pool worker process (see main.py)
+_document_scanner = None
+
+def init_document_worker():
+    """Build the scanner when a document pool worker starts, so no request pays for it."""
+    global _document_scanner
+    # Each worker already scans a whole document on its own core; a nested page
+    # pool per worker would oversubscribe the CPU
+    _document_scanner = PDFScanner(use_page_pool=False)
+
+def scan_pdf_in_worker(file_path: str) -> Dict[str, Any]:
+    """Scan a PDF inside a document pool worker."""
+    return _document_scanner.scan_pdf(file_path)
+
+def scan_and_redact_pdf_in_worker(file_path: str) -> Dict[str, Any]:
+    """Scan and redact a PDF inside a document pool worker."""
+    return _document_scanner.scan_and_redact_pdf(file_path)
@@ -6,7 +6,7 @@ Replaces in-memory metrics with shared Prometheus metrics.
 import time
 import psutil
 from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
-from typing import Optional
+from typing import Dict, List, Optional
 import threading
 
 class PrometheusMetrics:
@@ -16,6 +16,11 @@ class PrometheusMetrics:
         self.registry = registry or CollectorRegistry()
         self.start_time = time.time()
         
+        # Snapshot of collected samples shared by the metrics endpoints
+        self._samples = {}
+        self._samples_time = float('-inf')
+        self._samples_lock = threading.Lock()
+        
         # Processing metrics
         self.pdf_requests_total = Counter(
             'pdf_requests_total',
@@ -162,6 +167,23 @@ class PrometheusMetrics:
         """Get Prometheus metrics in text format."""
         return generate_latest(self.registry).decode('utf-8')
     
+    def get_samples(self, max_age_seconds: float = 1.0) -> Dict[str, List]:
+        """
+        Get current samples grouped by metric family name, read from the registry
+        without rendering and re-parsing exposition text. A snapshot is reused for
+        max_age_seconds, so a burst of dashboard requests collects only once.
+        """
+        now = time.monotonic()
+        with self._samples_lock:
+            if now - self._samples_time >= max_age_seconds:
+                # _created samples are series creation timestamps, not values
+                self._samples = {
+                    family.name: [sample for sample in family.samples if not sample.name.endswith('_created')]
+                    for family in self.registry.collect()
+                }
+                self._samples_time = now
+            return self._samples
+    
     def get_content_type(self) -> str:
         """Get the content type for metrics response."""
         return CONTENT_TYPE_LATEST
@@ -5,62 +5,147 @@ import aiohttp
 import time
 import json
 import argparse
+import logging
+import random
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import statistics
 
-async def upload_pdf(session, pdf_path, base_url="http://localhost:8000"):
-    """Upload a single PDF file"""
-    with open(pdf_path, 'rb') as f:
-        data = aiohttp.FormData()
-        data.add_field('file', f, filename=pdf_path.name, content_type='application/pdf')
-        
-        start_time = time.time()
-        try:
-            async with session.post(f"{base_url}/upload", data=data) as response:
-                end_time = time.time()
-                return {
-                    'status': response.status,
-                    'time': end_time - start_time,
-                    'success': response.status == 200,
-                    'file': pdf_path.name
-                }
-        except Exception as e:
-            end_time = time.time()
+# orjson serializes per-request records several times faster; fall back to stdlib json
+try:
+    import orjson
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+# uvloop's libuv-backed event loop cuts per-wakeup overhead; optional
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+logger = logging.getLogger(__name__)
+
+RESULTS_FILE = 'load_test_results.json'
+DETAILED_RESULTS_FILE = 'load_test_results.jsonl'
+RESPONSE_TIME_SAMPLE_SIZE = 10000  # Reservoir size used for percentiles
+PDF_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Upload bodies held in memory across requests
+
+async def post_pdf(session, pdf_path, body, base_url):
+    """POST a PDF body (bytes or open file) to the upload endpoint"""
+    data = aiohttp.FormData()
+    data.add_field('file', body, filename=pdf_path.name, content_type='application/pdf')
+    
+    # Monotonic high-resolution clock: immune to wall-clock adjustments mid-run
+    start_ns = time.perf_counter_ns()
+    try:
+        async with session.post(f"{base_url}/upload", data=data) as response:
             return {
-                'status': 0,
-                'time': end_time - start_time,
-                'success': False,
-                'error': str(e),
+                'status': response.status,
+                'time': (time.perf_counter_ns() - start_ns) / 1e9,
+                'success': response.status == 200,
                 'file': pdf_path.name
             }
+    except Exception as e:
+        return {
+            'status': 0,
+            'time': (time.perf_counter_ns() - start_ns) / 1e9,
+            'success': False,
+            'error': str(e),
+            'file': pdf_path.name
+        }
 
-async def run_load_test(concurrent_requests, total_requests, base_url, pdf_files):
-    """Run load test with specified parameters"""
-    print(f"Starting load test:")
-    print(f"  Base URL: {base_url}")
-    print(f"  Concurrent requests: {concurrent_requests}")
-    print(f"  Total requests: {total_requests}")
-    print(f"  PDF files available: {len(pdf_files)}")
-    print()
+async def upload_pdf(session, pdf_path, base_url="http://localhost:8000", body=None):
+    """Upload a single PDF file, from pre-read bytes when given"""
+    if body is not None:
+        return await post_pdf(session, pdf_path, body, base_url)
     
-    connector = aiohttp.TCPConnector(limit=concurrent_requests)
+    # Open off the event loop; aiohttp streams the body from the handle in
+    # 64 KiB executor reads instead of loading the whole file
+    f = await asyncio.to_thread(open, pdf_path, 'rb')
+    try:
+        return await post_pdf(session, pdf_path, f, base_url)
+    finally:
+        f.close()
+
+def load_pdf_bodies(pdf_files, cache_max_bytes=PDF_CACHE_MAX_BYTES):
+    """
+    Read PDFs into memory once so repeated uploads skip the open/read per request.
+    Files beyond cache_max_bytes are left out and streamed from disk instead.
+    """
+    bodies = {}
+    cached_bytes = 0
+    for pdf_path in set(pdf_files):
+        size = pdf_path.stat().st_size
+        if cached_bytes + size > cache_max_bytes:
+            continue
+        bodies[pdf_path] = pdf_path.read_bytes()
+        cached_bytes += size
+    return bodies
+
+async def generate_load(concurrent_requests, total_requests, base_url, pdf_files, results_path,
+                        cache_max_bytes=PDF_CACHE_MAX_BYTES):
+    """Send total_requests uploads and return running aggregates of the results"""
+    # Single target host: keep sockets alive across uploads and cache its DNS lookup.
+    # The per-host limit is the only cap; the consumer count already bounds in-flight requests
+    connector = aiohttp.TCPConnector(
+        limit=0,
+        limit_per_host=concurrent_requests,
+        use_dns_cache=True,
+        ttl_dns_cache=300,
+        keepalive_timeout=75,
+        enable_cleanup_closed=True,
+        force_close=False
+    )
     timeout = aiohttp.ClientTimeout(total=300)  # 5 minute timeout
     
-    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-        semaphore = asyncio.Semaphore(concurrent_requests)
-        
-        async def bounded_upload(pdf_path):
-            async with semaphore:
-                return await upload_pdf(session, pdf_path, base_url)
-        
-        start_time = time.time()
-        
-        # For large request counts, use a queue-based approach to limit memory
-        if total_requests > 2000:
-            print("Using queue-based approach for large request count...")
-            results = []
+    # The same files are uploaded repeatedly; read them once up front
+    pdf_bodies = await asyncio.to_thread(load_pdf_bodies, pdf_files, cache_max_bytes)
+    
+    with open(results_path, 'wb') as results_file:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            start_time = time.perf_counter()
+            
+            # Per-request records stream to disk; only aggregates stay in memory
+            stats = {
+                'success_count': 0,
+                'failure_count': 0,
+                'time_sum': 0.0,
+                'min_time': float('inf'),
+                'max_time': 0.0,
+                'last_progress': time.monotonic()
+            }
+            response_time_sample = []
+            sample_failures = []
             
-            # Create a queue of work items
+            def record_result(result):
+                results_file.write(dumps(result) + b"\n")
+                
+                if not result['success']:
+                    stats['failure_count'] += 1
+                    if len(sample_failures) < 5:
+                        sample_failures.append(result)
+                    return
+                
+                stats['success_count'] += 1
+                response_time = result['time']
+                stats['time_sum'] += response_time
+                stats['min_time'] = min(stats['min_time'], response_time)
+                stats['max_time'] = max(stats['max_time'], response_time)
+                
+                # Reservoir sampling keeps a uniform sample of response times for percentiles
+                if len(response_time_sample) < RESPONSE_TIME_SAMPLE_SIZE:
+                    response_time_sample.append(response_time)
+                else:
+                    slot = random.randrange(stats['success_count'])
+                    if slot < RESPONSE_TIME_SAMPLE_SIZE:
+                        response_time_sample[slot] = response_time
+            
+            # Queue-based producer/consumer keeps memory bounded by the queue size
+            # rather than holding a coroutine per request
             queue = asyncio.Queue(maxsize=concurrent_requests * 2)  # Small buffer
             
             # Producer: Add work to queue
@@ -78,14 +163,22 @@ async def run_load_test(concurrent_requests, total_requests, base_url, pdf_files
                     item = await queue.get()
                     if item is None:  # Shutdown signal
                         break
-                    i, pdf_file = item
-                    result = await upload_pdf(session, pdf_file, base_url)
-                    results.append(result)
+                    _, pdf_file = item
+                    try:
+                        result = await upload_pdf(session, pdf_file, base_url, pdf_bodies.get(pdf_file))
+                    except Exception as e:
+                        result = {'error': str(e), 'success': False}
+                    record_result(result)
                     
-                    if (i + 1) % 100 == 0:
-                        elapsed = time.time() - start_time
-                        rate = (i + 1) / elapsed if elapsed > 0 else 0
-                        print(f"Completed {i + 1}/{total_requests} requests ({rate:.1f} req/sec)")
+                    # Report at most once per second, independent of request rate
+                    now = time.monotonic()
+                    if now - stats['last_progress'] >= 1.0:
+                        stats['last_progress'] = now
+                        completed = stats['success_count'] + stats['failure_count']
+                        elapsed = time.perf_counter() - start_time
+                        rate = completed / elapsed if elapsed > 0 else 0
+                        # Lazy %-formatting: skipped entirely when INFO is filtered out
+                        logger.info("Completed %d/%d requests (%.1f req/sec)", completed, total_requests, rate)
             
             # Start producer and consumers
             producer_task = asyncio.create_task(producer())
@@ -94,47 +187,130 @@ async def run_load_test(concurrent_requests, total_requests, base_url, pdf_files
             await producer_task
             await asyncio.gather(*consumer_tasks)
             
-        else:
-            # For smaller request counts, use the original approach
-            tasks = []
-            for i in range(total_requests):
-                pdf_file = pdf_files[i % len(pdf_files)]
-                tasks.append(bounded_upload(pdf_file))
-            
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        end_time = time.time()
-        total_time = end_time - start_time
-    
-    # Process results
-    successful_results = []
-    failed_results = []
-    
-    for result in results:
-        if isinstance(result, Exception):
-            failed_results.append({'error': str(result), 'success': False})
-        elif result['success']:
-            successful_results.append(result)
-        else:
-            failed_results.append(result)
+            end_time = time.perf_counter()
+            total_time = end_time - start_time
+    
+    return {
+        'stats': stats,
+        'response_time_sample': response_time_sample,
+        'sample_failures': sample_failures,
+        'total_time': total_time
+    }
+
+def run_load_worker(concurrent_requests, total_requests, base_url, pdf_files, results_path, cache_max_bytes):
+    """Entry point for a load generator process: run its share on its own event loop"""
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if uvloop:
+        uvloop.install()
+    return asyncio.run(generate_load(concurrent_requests, total_requests, base_url, pdf_files, results_path,
+                                     cache_max_bytes))
+
+async def run_load_workers(workers, concurrent_requests, total_requests, base_url, pdf_files):
+    """
+    Split the run across worker processes so client-side CPU is not the bottleneck.
+    Each worker writes its own JSONL file; aggregates are merged here.
+    """
+    loop = asyncio.get_running_loop()
+    results_paths = []
+    
+    # Workers share the body cache budget rather than each holding a full one
+    cache_max_bytes = PDF_CACHE_MAX_BYTES // workers
+    
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = []
+        for n in range(workers):
+            worker_requests = total_requests // workers + (1 if n < total_requests % workers else 0)
+            worker_concurrency = concurrent_requests // workers + (1 if n < concurrent_requests % workers else 0)
+            if worker_requests == 0:
+                continue
+            results_path = DETAILED_RESULTS_FILE.replace('.jsonl', f'.{n}.jsonl')
+            results_paths.append(results_path)
+            futures.append(loop.run_in_executor(
+                pool, run_load_worker, worker_concurrency, worker_requests, base_url, pdf_files, results_path,
+                cache_max_bytes
+            ))
+        runs = await asyncio.gather(*futures)
+    
+    # Merge worker aggregates
+    stats = {
+        'success_count': sum(run['stats']['success_count'] for run in runs),
+        'failure_count': sum(run['stats']['failure_count'] for run in runs),
+        'time_sum': sum(run['stats']['time_sum'] for run in runs),
+        'min_time': min(run['stats']['min_time'] for run in runs),
+        'max_time': max(run['stats']['max_time'] for run in runs)
+    }
+    # A worker's reservoir sample stands for success_count / len(sample) requests each.
+    # Thin every sample to the sparsest rate (and to the reservoir size) so each worker
+    # weighs on the percentiles in proportion to its successful requests
+    samples = [(run['stats']['success_count'], run['response_time_sample'])
+               for run in runs if run['response_time_sample']]
+    response_time_sample = []
+    if samples:
+        keep_fraction = min([len(sample) / count for count, sample in samples] +
+                            [RESPONSE_TIME_SAMPLE_SIZE / stats['success_count']])
+        for count, sample in samples:
+            response_time_sample.extend(random.sample(sample, min(len(sample), round(count * keep_fraction))))
+    sample_failures = [f for run in runs for f in run['sample_failures']][:5]
+    
+    return {
+        'stats': stats,
+        'response_time_sample': response_time_sample,
+        'sample_failures': sample_failures,
+        'total_time': max(run['total_time'] for run in runs)
+    }, results_paths
+
+async def run_load_test(concurrent_requests, total_requests, base_url, pdf_files, workers=1):
+    """Run load test with specified parameters"""
+    # Every worker keeps at least one request in flight, so more workers than the
+    # requested concurrency would overshoot it
+    workers = max(1, min(workers, concurrent_requests))
+    print(f"Starting load test:")
+    print(f"  Base URL: {base_url}")
+    print(f"  Concurrent requests: {concurrent_requests}")
+    print(f"  Total requests: {total_requests}")
+    print(f"  PDF files available: {len(pdf_files)}")
+    print(f"  Worker processes: {workers}")
+    print()
+    
+    if workers > 1:
+        run, results_paths = await run_load_workers(workers, concurrent_requests, total_requests, base_url, pdf_files)
+    else:
+        run = await generate_load(concurrent_requests, total_requests, base_url, pdf_files, DETAILED_RESULTS_FILE)
+        results_paths = [DETAILED_RESULTS_FILE]
+    
+    stats = run['stats']
+    response_time_sample = run['response_time_sample']
+    sample_failures = run['sample_failures']
+    total_time = run['total_time']
     
     # Calculate statistics
-    success_count = len(successful_results)
-    failure_count = len(failed_results)
+    success_count = stats['success_count']
+    failure_count = stats['failure_count']
     success_rate = (success_count / total_requests) * 100
     
-    if successful_results:
-        response_times = [r['time'] for r in successful_results]
-        avg_response_time = statistics.mean(response_times)
-        min_response_time = min(response_times)
-        max_response_time = max(response_times)
-        median_response_time = statistics.median(response_times)
+    if success_count:
+        avg_response_time = stats['time_sum'] / success_count
+        min_response_time = stats['min_time']
+        max_response_time = stats['max_time']
+        # Percentiles from the fixed-size reservoir; one sort yields every
+        # cut point in permille, including the P99.9 tail
+        if len(response_time_sample) > 1:
+            permilles = statistics.quantiles(response_time_sample, n=1000, method='inclusive')
+            median_response_time = permilles[499]
+            p95_response_time = permilles[949]
+            p99_response_time = permilles[989]
+            p999_response_time = permilles[998]
+        else:
+            median_response_time = p95_response_time = p99_response_time = p999_response_time = response_time_sample[0]
         requests_per_second = success_count / total_time
     else:
         avg_response_time = 0
         min_response_time = 0
         max_response_time = 0
         median_response_time = 0
+        p95_response_time = 0
+        p99_response_time = 0
+        p999_response_time = 0
         requests_per_second = 0
     
     # Print results
@@ -149,29 +325,33 @@ async def run_load_test(concurrent_requests, total_requests, base_url, pdf_files
     print(f"Requests per second: {requests_per_second:.2f}")
     print()
     
-    if successful_results:
+    if success_count:
         print("Response Time Statistics:")
         print(f"  Average: {avg_response_time:.3f}s")
         print(f"  Median: {median_response_time:.3f}s")
+        print(f"  P95: {p95_response_time:.3f}s")
+        print(f"  P99: {p99_response_time:.3f}s")
+        print(f"  P99.9: {p999_response_time:.3f}s")
         print(f"  Min: {min_response_time:.3f}s")
         print(f"  Max: {max_response_time:.3f}s")
     
-    if failed_results:
+    if sample_failures:
         print()
         print("Sample failures:")
-        for i, failure in enumerate(failed_results[:5]):  # Show first 5 failures
+        for i, failure in enumerate(sample_failures):  # First 5 failures
             if 'error' in failure:
                 print(f"  {i+1}. Error: {failure['error']}")
             else:
                 print(f"  {i+1}. Status {failure.get('status', 'unknown')}: {failure.get('file', 'unknown')}")
     
-    # Save detailed results to JSON
+    # Save summary to JSON; per-request records are already in the JSONL file
     results_data = {
         'test_parameters': {
             'concurrent_requests': concurrent_requests,
             'total_requests': total_requests,
             'base_url': base_url,
-            'pdf_files_count': len(pdf_files)
+            'pdf_files_count': len(pdf_files),
+            'workers': workers
         },
         'summary': {
             'total_requests': total_requests,
@@ -182,19 +362,20 @@ async def run_load_test(concurrent_requests, total_requests, base_url, pdf_files
             'requests_per_second': requests_per_second,
             'avg_response_time': avg_response_time,
             'median_response_time': median_response_time,
+            'p95_response_time': p95_response_time,
+            'p99_response_time': p99_response_time,
+            'p999_response_time': p999_response_time,
             'min_response_time': min_response_time,
             'max_response_time': max_response_time
         },
-        'detailed_results': {
-            'successful': successful_results,
-            'failed': failed_results
-        }
+        'detailed_results_files': results_paths
     }
     
-    with open('load_test_results.json', 'w') as f:
+    with open(RESULTS_FILE, 'w') as f:
         json.dump(results_data, f, indent=2)
     
-    print(f"\nDetailed results saved to: load_test_results.json")
+    print(f"\nSummary saved to: {RESULTS_FILE}")
+    print(f"Detailed results saved to: {', '.join(results_paths)}")
     return results_data
 
 def find_pdf_files():
@@ -230,11 +411,15 @@ async def main():
                        help='Number of concurrent requests')
     parser.add_argument('--requests', '-r', type=int, default=100,
                        help='Total number of requests to make')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                       help='Number of load generator processes')
     parser.add_argument('--quick', action='store_true',
                        help='Quick test: 5 concurrent, 20 total requests')
     
     args = parser.parse_args()
     
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    
     if args.quick:
         args.concurrent = 5
         args.requests = 20
@@ -249,7 +434,9 @@ async def main():
     print(f"Found {len(pdf_files)} PDF files for testing")
     
     # Run the load test
-    await run_load_test(args.concurrent, args.requests, args.url, pdf_files)
+    await run_load_test(args.concurrent, args.requests, args.url, pdf_files, args.workers)
 
 if __name__ == "__main__":
+    if uvloop:
+        uvloop.install()
     asyncio.run(main())
\ No newline at end of file